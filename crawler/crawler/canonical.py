@@ -0,0 +1,181 @@
+"""
+    URL canonicalization and the set of the URLs already scheduled.
+
+    The same page is linked under many URLs: http and https, www.cs.ksu.edu
+    and cs.k-state.edu, with a #fragment or the query parameters in another
+    order. All of them have the same canonical URL, which is the one
+    requested and stored, so every page is fetched once.
+
+    The indexer imports this module through the indexer/canonical.py link,
+    its page URLs, links and anchors are canonicalized the same way.
+"""
+try:
+    from urlparse import urljoin, urlsplit, urlunsplit
+except ImportError:
+    from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# scheme of every canonical URL, the sites serve both
+CANONICAL_SCHEME = "https"
+
+# (alias, domain) the alias domain is replaced by
+HOST_ALIASES = [
+    ("k-state.edu", "ksu.edu"),
+]
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# bytes of the SHA1 of a URL kept in the seen set
+DIGEST_SIZE = 8
+
+
+def canonicalize_url(url, base=None):
+    """
+        The canonical form of a URL:
+            the scheme is CANONICAL_SCHEME
+            the host is in lower case, without the default port, its alias
+                domain replaced and without "www." when more labels are left
+                than the domain (www.cs.ksu.edu is cs.ksu.edu, www.ksu.edu
+                stays)
+            an empty path is /
+            the query parameters are sorted
+            the fragment is dropped
+
+        :param url absolute URL or a URL relative to base
+        :param base URL of the page of the link
+
+        :return canonical URL, None for a mailto:, tel:, javascript: or any
+            other not HTTP URL
+    """
+    url = url.strip()
+    try:
+        if base is not None:
+            url = urljoin(base, url)
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+
+    for alias, domain in HOST_ALIASES:
+        if host == alias or host.endswith("." + alias):
+            host = host[:-len(alias)] + domain
+            break
+
+    labels = host.split(".")
+    if labels[0] == "www" and len(labels) > 3:
+        host = ".".join(labels[1:])
+
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        host = "%s:%d" % (host, port)
+
+    # split by hand, parsing and encoding the query again may change it
+    query = "&".join(sorted(p for p in parts.query.split("&") if p))
+
+    return urlunsplit((CANONICAL_SCHEME, host, parts.path or "/", query, ""))
+
+
+class SeenUrls(object):
+    """
+        The canonical URLs scheduled in this run and the URLs fetched in
+        this and the earlier runs, kept as the first DIGEST_SIZE bytes of
+        their SHA1.
+
+        With a file the fetched URLs are loaded when the crawl starts and
+        saved when it ends, with the frontier of the URLs scheduled but not
+        fetched yet when the crawl was interrupted. A crawl continued with
+        the same file requests the frontier and skips the links to the
+        pages fetched in the earlier runs.
+    """
+
+    def __init__(self, seen_file=None):
+        self.seen_file = seen_file
+        self.frontier_file = seen_file + ".frontier" if seen_file is not None else None
+
+        # digests of the URLs fetched, loaded from the file
+        self.fetched = set()
+
+        # digests of the URLs scheduled in this run
+        self.scheduled = set()
+
+        # URLs scheduled and not fetched yet, by digest
+        self.pending = {}
+
+        # frontier of the interrupted run
+        self.frontier = []
+
+        if seen_file is not None:
+            self.load()
+
+    def __len__(self):
+        return len(self.scheduled)
+
+    def add(self, url, force=False):
+        """
+            :param force schedule a URL fetched in an earlier run again, as
+                the seeds and the pages crawled before
+
+            :return True when the URL was not seen before
+        """
+        digest = hashlib.sha1(url.encode("utf-8")).digest()[:DIGEST_SIZE]
+        if digest in self.scheduled or (not force and digest in self.fetched):
+            return False
+
+        self.scheduled.add(digest)
+        self.pending[digest] = url
+        return True
+
+    def done(self, url):
+        """
+            Record a response of the URL, it is not requested again.
+        """
+        digest = hashlib.sha1(url.encode("utf-8")).digest()[:DIGEST_SIZE]
+        self.scheduled.add(digest)
+        self.fetched.add(digest)
+        self.pending.pop(digest, None)
+
+    def load(self):
+        if os.path.exists(self.seen_file):
+            with open(self.seen_file, "rb") as fd:
+                data = fd.read()
+
+            self.fetched = set(data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE))
+            logger.info("Loaded %d fetched URLs from %s", len(self.fetched), self.seen_file)
+
+        if os.path.exists(self.frontier_file):
+            with open(self.frontier_file, "rb") as fd:
+                self.frontier = [line.decode("utf-8") for line in fd.read().splitlines() if line]
+            logger.info("Loaded %d URLs of the frontier from %s", len(self.frontier), self.frontier_file)
+
+    def save(self, interrupted=False):
+        """
+            :param interrupted save the URLs not fetched yet as the frontier
+                of the next run, the URLs left when the crawl finished were
+                filtered or failed
+        """
+        if self.seen_file is None:
+            return
+
+        with open(self.seen_file + ".tmp", "wb") as fd:
+            fd.write(b"".join(sorted(self.fetched)))
+        os.rename(self.seen_file + ".tmp", self.seen_file)
+        logger.info("Saved %d fetched URLs to %s", len(self.fetched), self.seen_file)
+
+        if not interrupted:
+            if os.path.exists(self.frontier_file):
+                os.remove(self.frontier_file)
+            return
+
+        with open(self.frontier_file + ".tmp", "wb") as fd:
+            fd.write(b"".join(url.encode("utf-8") + b"\n" for url in sorted(self.pending.values())))
+        os.rename(self.frontier_file + ".tmp", self.frontier_file)
+        logger.info("Saved %d URLs of the frontier to %s", len(self.pending), self.frontier_file)
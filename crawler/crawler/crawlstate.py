@@ -0,0 +1,108 @@
+"""
+    State of the crawled pages kept across the crawl runs, for the
+    incremental re-crawl.
+
+    For every page, by its canonical URL:
+        etag            ETag header of the last response or None
+        last_modified   Last-Modified header of the last response or None
+        content_hash    SHA1 of the page content
+        last_crawl      time of the last response, 304 included
+        links           canonical URLs of the links of the page, followed
+                        again when the page is not modified
+"""
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import hashlib
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(body):
+    """
+        SHA1 of the page content, as the indexer's contentHash.
+    """
+    return hashlib.sha1(body).hexdigest()
+
+
+class CrawlState(object):
+    """
+        Dictionary of the canonical URL and the state of the page, loaded
+        from the state file when the crawl starts and saved when it ends.
+    """
+
+    def __init__(self, state_file=None):
+        self.state_file = state_file
+        self.pages = {}
+
+        if state_file:
+            self.load()
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __contains__(self, url):
+        return url in self.pages
+
+    def urls(self):
+        return sorted(self.pages)
+
+    def get(self, url):
+        return self.pages.get(url)
+
+    def conditional_headers(self, url):
+        """
+            :return the If-None-Match and If-Modified-Since headers of a
+                request for the page, empty for a page never crawled
+        """
+        page = self.pages.get(url)
+        if page is None:
+            return {}
+
+        headers = {}
+        if page["etag"]:
+            headers["If-None-Match"] = page["etag"]
+        if page["last_modified"]:
+            headers["If-Modified-Since"] = page["last_modified"]
+
+        return headers
+
+    def update(self, url, etag, last_modified, page_hash, links):
+        self.pages[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_hash": page_hash,
+            "last_crawl": time.time(),
+            "links": links,
+        }
+
+    def touch(self, url):
+        """
+            Record a not modified response of the page.
+        """
+        self.pages[url]["last_crawl"] = time.time()
+
+    def remove(self, url):
+        self.pages.pop(url, None)
+
+    def load(self):
+        if not os.path.exists(self.state_file):
+            return
+
+        with open(self.state_file, "rb") as fd:
+            self.pages = pickle.load(fd)
+        logger.info("Loaded the state of %d pages from %s", len(self.pages), self.state_file)
+
+    def save(self):
+        if not self.state_file:
+            return
+
+        with open(self.state_file + ".tmp", "wb") as fd:
+            pickle.dump(self.pages, fd, pickle.HIGHEST_PROTOCOL)
+        os.rename(self.state_file + ".tmp", self.state_file)
+        logger.info("Saved the state of %d pages to %s", len(self.pages), self.state_file)
@@ -1,13 +1,24 @@
+import collections
 import re
 from urlparse import urlparse
 import scrapy
 
+from crawler.canonical import SeenUrls, canonicalize_url
+from crawler.crawlstate import CrawlState, content_hash
+
 class WebPage(scrapy.Item):
     page_url = scrapy.Field()
     page_title = scrapy.Field()
     page_content = scrapy.Field()
     page_links = scrapy.Field()
 
+class Tombstone(scrapy.Item):
+    """
+        A page crawled before which is gone, the indexer removes it.
+    """
+    page_url = scrapy.Field()
+    deleted = scrapy.Field()
+
 class KsuCSSpider(scrapy.Spider):
     name = "ksucs"
 
@@ -16,26 +27,144 @@ class KsuCSSpider(scrapy.Spider):
         "k-state.edu"
     ]
 
+    # not modified and gone pages are passed to parse
+    handle_httpstatus_list = [304, 404, 410]
+
+    def __init__(self, seen_file=None, state_file="crawl_state.pkl", *args, **kwargs):
+        """
+            :param seen_file file of the seen URLs kept across the runs,
+                scrapy crawl ksucs -a seen_file=seen_urls.bin
+            :param state_file file of the state of the crawled pages, empty
+                for a full crawl, scrapy crawl ksucs -a state_file=
+        """
+        super(KsuCSSpider, self).__init__(*args, **kwargs)
+
+        # ETag, Last-Modified, content hash and links of the pages crawled
+        # in the earlier runs, only the new and changed pages are emitted
+        self.crawl_state = CrawlState(state_file)
+
+        # pages by change: new, changed, unchanged, not_modified, deleted
+        self.changes = collections.Counter()
+
+        # canonical URLs already scheduled or fetched, a link to one of
+        # them is not requested again
+        self.seen = SeenUrls(seen_file)
+
+        # requests saved by the seen-URL filter, by reason
+        self.saved = collections.Counter()
+
     def start_requests(self):
+        # the seeds are the same site, only the first is requested
         urls = [
             "http://www.cs.ksu.edu", "http://cs.k-state.edu"
             ,"https://www.cs.ksu.edu", "https://cs.k-state.edu"
         ]
-
-        for url in urls:
-            yield scrapy.Request(url=url, callback=self.parse)
+        urls = [canonicalize_url(url) for url in urls]
+
+        # every page crawled before is checked again, even if no page links
+        # to it anymore, and the frontier of an interrupted crawl is
+        # requested, even when they were fetched in an earlier run
+        for url in urls + self.crawl_state.urls() + self.seen.frontier:
+            request = self.schedule(url, force=True)
+            if request is not None:
+                yield request
+
+    def schedule(self, url, force=False):
+        """
+            :param url canonical URL
+            :param force request the URL even if it was fetched in an
+                earlier run
+
+            :return scrapy.Request of the URL, conditional for a page
+                crawled before, None when it is off the site or was seen
+                before
+        """
+        if not self.is_allowed(url):
+            self.saved["offsite"] += 1
+            return None
+
+        if not self.seen.add(url, force):
+            self.saved["duplicate"] += 1
+            return None
+
+        # the requests skip Scrapy's duplicate filter and with it the
+        # OffsiteMiddleware, the offsite and seen URLs are filtered above; a
+        # redirect to a page already fetched must still reach parse to
+        # tombstone the old URL
+        return scrapy.Request(url=url, callback=self.parse, headers=self.crawl_state.conditional_headers(url),
+                              dont_filter=True)
+
+    def is_allowed(self, url):
+        """
+            :return True when the host of the URL is in allowed_domains, or
+                a subdomain of one of them
+        """
+        host = (urlparse(url).hostname or "").lower()
+        return any(host == domain or host.endswith("." + domain) for domain in self.allowed_domains)
+
+    def closed(self, reason):
+        self.seen.save(interrupted=reason != "finished")
+        self.crawl_state.save()
+
+        for key, n in self.changes.items():
+            self.crawler.stats.set_value("pages/%s" % key, n)
+        self.logger.info("Pages: %d new, %d changed, %d deleted, %d not modified, %d unchanged",
+                         self.changes["new"], self.changes["changed"], self.changes["deleted"],
+                         self.changes["not_modified"], self.changes["unchanged"])
+
+        for key, n in self.saved.items():
+            self.crawler.stats.set_value("seen_filter/%s" % key, n)
+        self.logger.info("Seen-URL filter saved %d requests: %d duplicate URLs, %d not HTTP links, "
+                         "%d offsite links; %d URLs scheduled",
+                         sum(self.saved.values()), self.saved["duplicate"], self.saved["not_http"],
+                         self.saved["offsite"], len(self.seen))
 
     def parse(self, response):
 
+        # Page URL, a redirect may have ended on a URL not seen yet
+        #print("Parsing: "+response.url)
+        url = canonicalize_url(response.url) or response.url
+        redirect_urls = [canonicalize_url(u) or u for u in response.meta.get("redirect_urls", [])]
+        for fetched_url in redirect_urls + [url]:
+            self.seen.done(fetched_url)
+
+        # a page crawled before now redirects, its old URL is gone and the
+        # page is indexed under the URL it redirects to
+        for old_url in redirect_urls:
+            if old_url != url and old_url in self.crawl_state:
+                self.changes["deleted"] += 1
+                self.crawl_state.remove(old_url)
+                yield Tombstone(page_url=old_url, deleted=True)
+
+        # redirected off the site
+        if not self.is_allowed(url):
+            return
+
+        # not modified since the last crawl, follow the links it had then
+        if response.status == 304:
+            self.changes["not_modified"] += 1
+            if url in self.crawl_state:
+                self.crawl_state.touch(url)
+                for link in self.crawl_state.get(url)["links"]:
+                    request = self.schedule(link)
+                    if request is not None:
+                        yield request
+            return
+
+        # gone from the site
+        if response.status in (404, 410):
+            if url in self.crawl_state:
+                self.changes["deleted"] += 1
+                self.crawl_state.remove(url)
+                yield Tombstone(page_url=url, deleted=True)
+            return
+
         # process only HTML content
-        if not re.match('text/html', response.headers.get('Content-Type').decode('utf-8')):
+        if not re.match('text/html', response.headers.get('Content-Type', b'').decode('utf-8')):
             return
 
         page = WebPage()
-
-        # Page URL
-        #print("Parsing: "+response.url)
-        page['page_url'] = response.url
+        page['page_url'] = url
 
         # Page title 
         page['page_title'] = response.selector.xpath('//title/text()').extract_first()
@@ -55,28 +184,21 @@ class KsuCSSpider(scrapy.Spider):
         for href in response.css("a::attr(href)"):
             #print(href)
             
-            ## Convert relative URLs into full URLs
-            url = href.extract().split("/")
-
-            # skip mailto and tel
-            if url[0][:7] == "mailto:" or url[0][:4] == "tel:":
-                print("----- Skipping %s" % url)
-                pass
-
-            url_cleaned = ""
-            # if starts with HTTP
-            if url[0][:4] == "http":
-                url_cleaned = href.extract()
-            else:
-                # else join with parent URL we are visiting
-                url_cleaned = response.urljoin(href.extract())
+            ## Convert relative URLs into full canonical URLs, mailto, tel
+            ## and javascript links are skipped
+            url_cleaned = canonicalize_url(href.extract(), response.url)
+            if url_cleaned is None:
+                self.saved["not_http"] += 1
+                continue
 
             # Add the URL to the list of links contained in the page for link analysis
             page['page_links'].append(url_cleaned)
             #print("Cleaned URL: "+url_cleaned)
 
-            # add the URL for crawling, the allowed_domain setting will ignore non K-state domains
-            yield scrapy.Request(url=url_cleaned, callback=self.parse)
+            # add the URL for crawling, schedule skips the domains not in allowed_domains
+            request = self.schedule(url_cleaned)
+            if request is not None:
+                yield request
             
             #domain = urlparse(url_cleaned).netloc
             #print("Domain: "+ domain)
@@ -84,6 +206,18 @@ class KsuCSSpider(scrapy.Spider):
             #    print("Adding to crawling list: "+url_cleaned)
                 #yield scrapy.Request(url=url_cleaned, callback=self.parse)
             
+        # the server may not send the validators, or a new ETag for the
+        # same content: only a page whose content changed is emitted
+        page_hash = content_hash(response.body)
+        previous = self.crawl_state.get(url)
+        self.crawl_state.update(url, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                                page_hash, page['page_links'])
+
+        if previous is not None and previous["content_hash"] == page_hash:
+            self.changes["unchanged"] += 1
+            return
+
+        self.changes["changed" if previous is not None else "new"] += 1
  
         # return the populated WebPage
         yield page
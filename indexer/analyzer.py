@@ -0,0 +1,193 @@
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
+import re
+import string
+
+from stemming.porter import stem
+
+# dot and dash separate words, replace them with space
+SEPARATOR_TABLE = dict((ord(c), ord(u" ")) for c in u".-")
+
+# punctuations are removed from the words
+# Ref: https://stackoverflow.com/questions/23175809/typeerror-translate-takes-one-argument-2-given-python#23306505
+PUNCTUATION_TABLE = dict((ord(c), None) for c in string.punctuation)
+
+# a word is a run of non white-space characters
+WORD_RE = re.compile(r"\S+", re.UNICODE)
+
+# number of distinct words the stem cache remembers
+STEM_CACHE_SIZE = 200000
+
+
+class StemCache(object):
+    """
+        Memoize the Porter stemmer.
+
+        Web text has a Zipfian vocabulary, the same few thousand words are
+        stemmed over and over. Once max_size words are cached new words are
+        still stemmed but no longer remembered; max_size None means no limit.
+    """
+
+    def __init__(self, max_size=STEM_CACHE_SIZE):
+        self.max_size = max_size
+        self.table = {}
+        self.hits = 0
+        self.misses = 0
+
+        # words cached since the last call of learned
+        self.new_stems = {}
+
+    def stem(self, word):
+        try:
+            stemmed = self.table[word]
+            self.hits += 1
+            return stemmed
+        except KeyError:
+            pass
+
+        self.misses += 1
+        stemmed = stem(word)
+        if self.max_size is None or len(self.table) < self.max_size:
+            self.table[word] = stemmed
+            self.new_stems[word] = stemmed
+
+        return stemmed
+
+    def learned(self):
+        """
+            :return dictionary of the words cached since the last call, a
+                worker process sends them to the cache of the parent
+        """
+        new_stems, self.new_stems = self.new_stems, {}
+        return new_stems
+
+    def update(self, table):
+        """
+            Add the words of the table until the cache is full.
+        """
+        for word, stemmed in table.items():
+            if self.max_size is not None and len(self.table) >= self.max_size:
+                break
+            self.table.setdefault(word, stemmed)
+
+    def reset(self):
+        """
+            Reset the hit and miss counters, the cached words are kept.
+        """
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+            :return dictionary of hits, misses, hit_rate and size
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / float(lookups) if lookups else 0.0,
+            "size": len(self.table),
+        }
+
+    def load(self, cache_file):
+        """
+            Load the word to stem table saved by a previous run.
+        """
+        try:
+            with open(cache_file, "rb") as fd:
+                table = pickle.load(fd)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return
+
+        self.update(table)
+
+    def save(self, cache_file):
+        """
+            Save the word to stem table for the next run.
+        """
+        with open(cache_file, "wb") as fd:
+            pickle.dump(self.table, fd, pickle.HIGHEST_PROTOCOL)
+
+
+# shared by every caller of stemm_word
+stem_cache = StemCache()
+
+
+def getStopWordList(stop_word_list_file_path=None):
+    """
+        Read the stop words, one per line, from the file. Without a file
+        the NLTK English stop words are used.
+
+    :param stop_word_list_file_path: String
+
+    :return: frozenset of stop words
+    """
+    if stop_word_list_file_path == None:
+        from nltk.corpus import stopwords
+        return frozenset(stopwords.words('english'))
+
+    with open(stop_word_list_file_path, "r") as fd:
+        return frozenset(l.strip() for l in fd)
+
+
+def stemm_word(word):
+    """
+        Use Porter stemmer to stem words, through the stem cache.
+
+    :param word: String
+
+    :return: Stemmed word
+    """
+    return stem_cache.stem(word)
+
+
+def tokenize(text, stop_word_list):
+    """
+        Generate the sanitized words of a text one at a time: numbers and
+        stop words are dropped, punctuations removed and the words stemmed.
+
+    :param text: String
+    :param stop_word_list: set of stop words
+
+    :return: generator of words
+    """
+
+    # convert the text into Unicode and replace dot and dash with space
+    text = unicode(text).translate(SEPARATOR_TABLE)
+
+    for match in WORD_RE.finditer(text):
+        w = match.group()
+
+        # ignore numbers
+        if w.isnumeric():
+            continue
+
+        w = w.translate(PUNCTUATION_TABLE).lower()
+
+        # Note: Remove stop-words before Stemming, or else the stop-word
+        # matching will not work.
+        if w in stop_word_list:
+            continue
+
+        w = stemm_word(w)
+
+        # hack, hack, hack
+        if w == '':
+            continue
+
+        yield w
+
+
+def sanitize(text, stop_word_list):
+    """
+        Reads a text, remove stop words, stem the words.
+
+    :param text: String
+    :param stop_word_list: set of stop words
+
+    :return: List of words
+    """
+    return list(tokenize(text, stop_word_list))
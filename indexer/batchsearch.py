@@ -0,0 +1,155 @@
+"""
+    Run a file of queries through search_batch and write the ranked results
+    as JSON lines, one line per query in the order of the file.
+
+    A query line is either the query or a query id, a tab and the query.
+
+    Usage:
+        python batchsearch.py queries.txt --output results.jsonl --workers 4
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import sys
+import time
+
+from analyzer import getStopWordList
+from search import DEFAULT_MODEL, RANKING_MODELS, loadData, parse_boosts, search_batch
+
+# number of queries searched together, the postings are shared in a batch
+BATCH_SIZE = 256
+
+# the index of a worker process, opened by initWorker
+worker_index = None
+
+
+def readQueries(queries_file):
+    """
+        :return list of (query id, query string)
+    """
+    queries = []
+    with io.open(queries_file, "r", encoding="utf-8") as fd:
+        for n, line in enumerate(fd, 1):
+            line = line.strip()
+            if not line:
+                continue
+
+            if "\t" in line:
+                query_id, query = line.split("\t", 1)
+            else:
+                query_id, query = str(n), line
+            queries.append((query_id, query))
+
+    return queries
+
+
+def loadIndex(index_dir, stop_words_file):
+    index_data, pagerank_data = loadData(index_dir)
+    return index_data, pagerank_data, getStopWordList(stop_words_file)
+
+
+def initWorker(index_dir, stop_words_file):
+    """
+        Set up a worker process, each worker maps the index itself.
+    """
+    global worker_index
+    worker_index = loadIndex(index_dir, stop_words_file)
+
+
+def searchBatch(args):
+    """
+        Search a batch of queries in a worker process.
+
+        :return list of result dictionaries
+    """
+    batch, model, topN, boosts = args
+    return searchQueries(worker_index, batch, model, topN, boosts)
+
+
+def searchQueries(index, batch, model, topN, boosts=None):
+    index_data, pagerank_data, stop_word_list = index
+    docs = index_data.docs
+
+    results = search_batch(index_data, pagerank_data, stop_word_list, [query for _, query in batch], model, topN,
+                           boosts)
+
+    def ranked(scores):
+        return [{"doc": doc, "url": docs.url(doc), "score": score} for doc, score in scores]
+
+    return [{
+        "id": query_id,
+        "query": query,
+        "matches": len(links),
+        "results": ranked(vector_ranked.items()),
+        "pagerank": ranked(list(page_ranked.items())[:topN]),
+    } for (query_id, query), (links, vector_ranked, page_ranked) in zip(batch, results)]
+
+
+def batches(queries, batch_size):
+    for start in range(0, len(queries), batch_size):
+        yield queries[start:start + batch_size]
+
+
+def run(index_dir, queries, output, workers=1, model=DEFAULT_MODEL, topN=10, batch_size=BATCH_SIZE,
+        stop_words_file="stopwords.txt", boosts=None):
+    """
+        Search the queries and write a JSON line per query to output.
+
+        :param queries list of (query id, query string)
+        :param output file object
+        :param boosts dictionary of field and boost of the bm25f model
+
+        :return number of queries searched
+    """
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initWorker, (index_dir, stop_words_file))
+        results = pool.imap(searchBatch, ((batch, model, topN, boosts) for batch in batches(queries, batch_size)))
+    else:
+        pool = None
+        index = loadIndex(index_dir, stop_words_file)
+        results = (searchQueries(index, batch, model, topN, boosts) for batch in batches(queries, batch_size))
+
+    n = 0
+    for batch_results in results:
+        for result in batch_results:
+            output.write(json.dumps(result) + "\n")
+            n += 1
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    return n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search a file of queries")
+    parser.add_argument("queries_file", help="one query per line, optionally prefixed by a query id and a tab")
+    parser.add_argument("--index-dir", default=".", help="directory the indexer wrote the index to")
+    parser.add_argument("--output", help="JSON lines file of the results, standard output by default")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--model", default=DEFAULT_MODEL, choices=RANKING_MODELS)
+    parser.add_argument("--boosts", type=parse_boosts, help="field boosts of bm25f, e.g. title:3,anchor:2")
+    parser.add_argument("-n", type=int, default=10, help="results per query")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--stop-words", default="stopwords.txt")
+    args = parser.parse_args()
+
+    queries = readQueries(args.queries_file)
+
+    if args.output:
+        output = open(args.output, "w")
+    else:
+        # keep the messages of the index loading out of the results
+        output = sys.stdout
+        sys.stdout = sys.stderr
+
+    start = time.time()
+    n = run(args.index_dir, queries, output, args.workers, args.model, args.n, args.batch_size, args.stop_words,
+            args.boosts)
+    elapsed = time.time() - start
+    if args.output:
+        output.close()
+
+    sys.stderr.write("Searched %d queries in %.2fs, %.1f queries/sec\n" % (n, elapsed, n / elapsed if elapsed else 0.0))
@@ -0,0 +1,283 @@
+"""
+    Benchmarks for the indexer and search.
+
+    Usage:
+        python benchmark.py pagerank [--sizes 10000,100000,1000000]
+        python benchmark.py analyzer --crawl ksucs_2017-12-09_20.json
+        python benchmark.py extract --crawl ksucs_2017-12-09_20.json
+        python benchmark.py query --queries "computer science;beocat help"
+"""
+import argparse
+import collections
+import json
+import operator
+import random
+import string
+import time
+
+from stemming.porter import stem
+
+from analyzer import getStopWordList, sanitize, stem_cache
+from extractor import BACKENDS, etree, extractPage
+from indexer import parseSGML
+from pagerank import EPSILON, build_link_graph, pagerank
+from diskindex import MappedIndex
+from metrics import percentile
+from search import RANKING_MODELS, normalize_scores, rank_links, top_k
+
+
+def legacy_pagerank_with_teleport(Graph, epsilon, iterations=50):
+    """
+        The original nested-loop PageRank, kept to compare against.
+    """
+    ROUND_DIGITS = 6
+
+    prev_score = None
+    score = None
+    iteration = 1
+
+    while True:
+        iteration += 1
+
+        # first iteration
+        if score is None:
+            score = {}
+            no_of_nodes = len(Graph.keys())
+            for node in Graph:
+                score[node] = 1/float(no_of_nodes)
+        else:
+            # normal iterations
+            score = {}
+            for A in Graph:
+                # Reinitialize the score
+                score[A] = epsilon/float(no_of_nodes)
+
+                for B in Graph:
+                    try:
+                        _ = Graph.get(B).index(A)
+                        degree_B = len(Graph.get(B))
+                        score[A] += (1-epsilon) * prev_score[B]/float(degree_B)
+                    except ValueError:
+                        pass
+                score[A] = round(score[A], ROUND_DIGITS)
+
+        score = normalize_scores(score)
+
+        # check for convergence
+        if score == prev_score:
+            break
+
+        prev_score = score
+
+        if iteration > iterations:
+            break
+
+    sorted_by_score = sorted(score.items(), key=operator.itemgetter(1), reverse=True)
+
+    sorted_score = collections.OrderedDict()
+    for url, score in sorted_by_score:
+        sorted_score[url] = score
+
+    return sorted_score
+
+
+def legacy_sanitize(text, stop_word_list):
+    """
+        The original per-word sanitize, kept to compare against.
+    """
+    text = unicode(text)
+
+    text = text.translate({ord("."): ord(" ")})
+    text = text.translate({ord("-"): ord(" ")})
+
+    words = text.split()
+    sanitized_words = []
+    for w in words:
+        if w.isnumeric():
+            continue
+
+        w = w.translate({ord(c): None for c in string.punctuation})
+        w = w.lower()
+
+        try:
+            i = stop_word_list.index(w.lower())
+            continue
+        except ValueError:
+            pass
+
+        w = stem(w)
+
+        if w == '':
+            continue
+
+        sanitized_words.append(w)
+
+    return sanitized_words
+
+
+def synthetic_link_data(no_of_nodes, avg_degree, seed=833):
+    """
+        Random link_data with integer nodes. Roughly one page in ten has no
+        outgoing links.
+    """
+    rnd = random.Random(seed)
+    link_data = {}
+    for node in range(no_of_nodes):
+        if rnd.random() < 0.1:
+            link_data[node] = []
+            continue
+        degree = rnd.randint(1, 2 * avg_degree - 1)
+        link_data[node] = list(set(rnd.randrange(no_of_nodes) for _ in range(degree)))
+    return link_data
+
+
+def bench_pagerank(args):
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    print("%10s %12s %12s %12s %12s" % ("nodes", "edges", "build (s)", "rank (s)", "legacy (s)"))
+    for n in sizes:
+        link_data = synthetic_link_data(n, args.degree)
+        edges = sum(len(v) for v in link_data.values())
+
+        start = time.time()
+        graph = build_link_graph(link_data)
+        build_time = time.time() - start
+
+        start = time.time()
+        pagerank(graph, EPSILON)
+        rank_time = time.time() - start
+
+        legacy = "skipped"
+        if n <= args.legacy_limit:
+            start = time.time()
+            legacy_pagerank_with_teleport(link_data, EPSILON, args.iterations)
+            legacy = "%.3f" % (time.time() - start)
+
+        print("%10d %12d %12.3f %12.3f %12s" % (n, edges, build_time, rank_time, legacy))
+
+
+def bench_analyzer(args):
+    stop_words = getStopWordList(args.stop_words)
+
+    # extract the text once, only the sanitize step is measured
+    texts = []
+    with open(args.crawl, "r") as fd:
+        for line in fd:
+            webpage_data = json.loads(line)
+            title, content = parseSGML(webpage_data["page_content"])
+            texts.append(title + "\n" + content)
+            if len(texts) == args.pages:
+                break
+
+    for name, func, stop_word_list in [
+            ("legacy", legacy_sanitize, list(stop_words)),
+            ("analyzer", sanitize, stop_words)]:
+        tokens = 0
+        start = time.time()
+        for text in texts:
+            tokens += len(func(text, stop_word_list))
+        elapsed = time.time() - start
+
+        print("%-10s pages: %d \t tokens: %d \t time: %.3fs \t tokens/sec: %.0f" %
+              (name, len(texts), tokens, elapsed, tokens / elapsed))
+
+    print("Stem cache: %(hits)d hits, %(misses)d misses, hit rate %(hit_rate).3f, %(size)d words" % stem_cache.stats())
+
+
+def bench_extract(args):
+    stop_words = getStopWordList(args.stop_words)
+
+    pages = []
+    with open(args.crawl, "r") as fd:
+        for line in fd:
+            pages.append(json.loads(line)["page_content"])
+            if len(pages) == args.pages:
+                break
+    nbytes = sum(len(page.encode("utf-8")) for page in pages)
+
+    # the tokens the index gets from each page, bs4 is the reference
+    reference = None
+    for backend in ["bs4"] + [name for name in BACKENDS if name != "bs4"]:
+        if backend == "lxml" and etree is None:
+            print("%-10s not installed" % backend)
+            continue
+
+        start = time.time()
+        extracted = [extractPage(page, backend) for page in pages]
+        elapsed = time.time() - start
+
+        tokens = [sanitize(page.title + "\n" + page.text, stop_words) for page in extracted]
+        if reference is None:
+            reference = tokens
+        same = sum(1 for expected, got in zip(reference, tokens) if expected == got)
+
+        print("%-10s pages: %d \t time: %.3fs \t pages/sec: %.0f \t MB/sec: %.2f \t same tokens: %d" %
+              (backend, len(pages), elapsed, len(pages) / elapsed, nbytes / elapsed / 2 ** 20, same))
+
+
+def bench_query(args):
+    stop_words = getStopWordList(args.stop_words)
+    index_data = MappedIndex(args.index, args.docs)
+
+    print("%-32s %-6s %8s %10s %10s %10s %10s" %
+          ("query", "model", "matches", "full p50", "full p99", "top-k p50", "top-k p99"))
+    for query in args.queries.split(";"):
+        query_terms = sanitize(query, stop_words)
+
+        for model in RANKING_MODELS:
+            full_times = []
+            top_times = []
+            matches = 0
+            for _ in range(args.repeat):
+                start = time.time()
+                matches = len(rank_links(index_data, query_terms, None, model))
+                full_times.append(time.time() - start)
+
+                start = time.time()
+                top_k(index_data, query_terms, args.k, None, model)
+                top_times.append(time.time() - start)
+
+            print("%-32s %-6s %8d %9.2fms %9.2fms %9.2fms %9.2fms" %
+                  (query[:32], model, matches,
+                   1000 * percentile(full_times, 50), 1000 * percentile(full_times, 99),
+                   1000 * percentile(top_times, 50), 1000 * percentile(top_times, 99)))
+
+    index_data.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CSSearch benchmarks")
+    subparsers = parser.add_subparsers()
+
+    p = subparsers.add_parser("pagerank", help="CSR PageRank against the legacy loop")
+    p.add_argument("--sizes", default="10000,100000,1000000")
+    p.add_argument("--degree", type=int, default=5, help="average out-degree")
+    p.add_argument("--iterations", type=int, default=10, help="legacy iterations")
+    p.add_argument("--legacy-limit", type=int, default=10000,
+                   help="largest graph the legacy loop is run on")
+    p.set_defaults(func=bench_pagerank)
+
+    p = subparsers.add_parser("analyzer", help="sanitize tokens/sec against the legacy sanitize")
+    p.add_argument("--crawl", required=True, help="JSON lines crawl file")
+    p.add_argument("--stop-words", default="stopwords.txt")
+    p.add_argument("--pages", type=int, default=1000, help="pages to read from the crawl")
+    p.set_defaults(func=bench_analyzer)
+
+    p = subparsers.add_parser("extract", help="pages/sec of the HTML text extractor backends")
+    p.add_argument("--crawl", required=True, help="JSON lines crawl file")
+    p.add_argument("--stop-words", default="stopwords.txt")
+    p.add_argument("--pages", type=int, default=1000, help="pages to read from the crawl")
+    p.set_defaults(func=bench_extract)
+
+    p = subparsers.add_parser("query", help="full ranking against top-k latency")
+    p.add_argument("--index", default="index.bin")
+    p.add_argument("--docs", default="docs.bin")
+    p.add_argument("--stop-words", default="stopwords.txt")
+    p.add_argument("--queries", default="computer science;computer science information retrieval;beocat help",
+                   help="queries separated by ;")
+    p.add_argument("-k", type=int, default=10, help="number of results")
+    p.add_argument("--repeat", type=int, default=20, help="runs of every query")
+    p.set_defaults(func=bench_query)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1 @@
+../crawler/crawler/canonical.py
\ No newline at end of file
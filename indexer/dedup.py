@@ -0,0 +1,168 @@
+"""
+    Duplicate and near-duplicate detection of the indexed pages.
+
+    The fingerprint of a page is taken from its sanitized words:
+
+        text hash   SHA1 of the words, equal for the pages with the same text
+        SimHash     64 bit SimHash of the pairs of consecutive words, only a
+                    few bits differ for nearly the same text, as a page with
+                    a date or a visit counter in it
+
+    The pages are clustered by doc id: a page is a duplicate of the first
+    page before it with the same text hash, or a SimHash at most
+    MAX_DISTANCE bits away. A page with fewer than MIN_WORDS words has no
+    fingerprint and is never a duplicate, the pages without text (script
+    only pages, framesets) would all have the same one. The first page of a cluster is its canonical
+    doc, the others are left out of the search index.
+"""
+import hashlib
+
+# bits of the SimHash of two near-duplicates which may differ
+MAX_DISTANCE = 3
+
+# a page with fewer words is never a duplicate
+MIN_WORDS = 10
+
+# bits of a lane of the SimHash counters, the words of a page must be less
+# than 2 ** LANE_BITS
+LANE_BITS = 32
+
+# SPREAD[b] has bit i of the byte b moved to the lowest bit of lane i
+SPREAD = [sum(1 << (LANE_BITS * i) for i in range(8) if b & (1 << i)) for b in range(256)]
+
+# the SimHash split in MAX_DISTANCE + 1 blocks, two SimHashes at most
+# MAX_DISTANCE bits away have at least one equal block
+BLOCK_BITS = 64 // (MAX_DISTANCE + 1)
+BLOCK_MASK = (1 << BLOCK_BITS) - 1
+
+
+def textHash(words):
+    """
+        SHA1 of the words of a page.
+    """
+    return hashlib.sha1(u" ".join(words).encode("utf-8")).hexdigest()
+
+
+def simhash(words):
+    """
+        SimHash of the distinct pairs of consecutive words.
+
+        Bit i of the SimHash is set when more than half of the pairs have
+        bit i set in their hash. Every pair counts once, a pair repeated
+        all over a page would otherwise set every bit by itself. The pairs
+        are counted by hash byte first and moved to 64 lanes of a single
+        integer at the end, instead of 64 counters updated for every pair.
+
+        :param words list of the words of a page
+
+        :return 64 bit integer
+    """
+    features = set(u" ".join(pair) for pair in zip(words, words[1:]))
+
+    byte_counts = [[0] * 256 for _ in range(8)]
+    for feature in features:
+        digest = bytearray(hashlib.md5(feature.encode("utf-8")).digest()[:8])
+        for j, b in enumerate(digest):
+            byte_counts[j][b] += 1
+    total = len(features)
+
+    lanes = 0
+    for j, counts in enumerate(byte_counts):
+        part = 0
+        for b, count in enumerate(counts):
+            if count:
+                part += count * SPREAD[b]
+        lanes += part << (8 * LANE_BITS * j)
+
+    lane_mask = (1 << LANE_BITS) - 1
+    value = 0
+    for i in range(64):
+        if 2 * ((lanes >> (LANE_BITS * i)) & lane_mask) > total:
+            value |= 1 << i
+
+    return value
+
+
+def fingerprint(words):
+    """
+        :return (text hash, SimHash), (None, None) when the page has fewer
+            than MIN_WORDS words
+    """
+    if len(words) < MIN_WORDS:
+        return None, None
+
+    return textHash(words), simhash(words)
+
+
+def hammingDistance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def findDuplicates(fingerprints):
+    """
+        Cluster the pages by their fingerprints.
+
+        The SimHashes of the canonical docs are kept in a table per block,
+        so a page is only compared with the docs sharing a block with it.
+
+        :param fingerprints list of (text hash, SimHash) or None for the
+            docs which are not indexed, indexed by doc id. A SimHash None
+            is a page too short to be clustered.
+
+        :return dictionary of the doc id of every duplicate with the doc id
+            of its canonical doc
+    """
+    duplicates = {}
+    text_hashes = {}
+    blocks = [{} for _ in range(MAX_DISTANCE + 1)]
+
+    for doc_id, doc_fingerprint in enumerate(fingerprints):
+        if doc_fingerprint is None or doc_fingerprint[1] is None:
+            continue
+
+        text_hash, value = doc_fingerprint
+        canonical = text_hashes.get(text_hash)
+
+        if canonical is None:
+            for i, table in enumerate(blocks):
+                for candidate in table.get((value >> (BLOCK_BITS * i)) & BLOCK_MASK, ()):
+                    if (canonical is None or candidate < canonical) and \
+                            hammingDistance(value, fingerprints[candidate][1]) <= MAX_DISTANCE:
+                        canonical = candidate
+
+        if canonical is not None:
+            duplicates[doc_id] = canonical
+            text_hashes.setdefault(text_hash, canonical)
+            continue
+
+        text_hashes[text_hash] = doc_id
+        for i, table in enumerate(blocks):
+            table.setdefault((value >> (BLOCK_BITS * i)) & BLOCK_MASK, []).append(doc_id)
+
+    return duplicates
+
+
+def canonicalLinks(link_data, duplicates):
+    """
+        Merge the links of the duplicates into their canonical doc, and
+        point the links to a duplicate to its canonical doc. The links
+        between the pages of a cluster are dropped.
+
+        :param link_data as dictionary of doc id with the doc ids it links to
+        :param duplicates dictionary of duplicate and canonical doc id
+
+        :return dictionary of doc id with the sorted doc ids it links to
+    """
+    if not duplicates:
+        return link_data
+
+    merged = {}
+    for src_id, dest_ids in link_data.items():
+        canonical = duplicates.get(src_id, src_id)
+        links = merged.setdefault(canonical, set())
+        for dest_id in dest_ids:
+            dest_canonical = duplicates.get(dest_id, dest_id)
+            if dest_canonical != canonical or dest_id == src_id:
+                links.add(dest_canonical)
+
+    return dict((src_id, sorted(links)) for src_id, links in merged.items())
@@ -0,0 +1,743 @@
+"""
+    Compact on-disk inverted index, opened with mmap by the search.
+
+    index file:
+        header      magic, version, number of terms, number of indexed docs,
+                    number of doc ids, offset of the term dictionary, offset
+                    of the term strings, flags (FLAG_POSITIONS)
+        postings    for every term: doc id deltas, tfs, field tfs, all
+                    varints, for a frequent term a bitmap of its docs, and
+                    in an index with positions the position deltas of
+                    every posting
+        dictionary  one fixed size entry per term sorted by term:
+                    term string offset and length, postings offset and
+                    length, bitmap offset or 0, document frequency, IDF,
+                    and the upper bounds
+                    used to skip postings: largest tf, smallest doc length
+                    and largest normalized TF-IDF weight tf * idf / norm,
+                    then the largest tf and the smallest field length of
+                    every field, positions offset and length or 0
+        strings     UTF-8 term strings
+
+    doc table file:
+        header      magic, version, number of docs, average doc length,
+                    average length of every field
+        lengths     number of words of every doc
+        norms       length of the TF-IDF vector of every doc
+        fields      length of every field of every doc
+        offsets     2 * number of docs + 1 offsets into the strings
+        strings     UTF-8 URL and title of doc 0, of doc 1, ...
+
+    The tf of a term is its count in the title and the text of the page, as
+    the page was indexed before it had fields. The field tfs break it down
+    for the field weighted ranking (see FIELDS); a doc whose inbound anchor
+    text alone has the term is in the postings with tf 0.
+"""
+import logging
+import math
+import mmap
+import os
+import struct
+from array import array
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b"CSSI"
+DOCS_MAGIC = b"CSSD"
+VERSION = 6
+
+# the index has the positions of the terms in the docs
+FLAG_POSITIONS = 1
+
+# the fields of a doc:
+#   title   the page title
+#   heading the h1 - h6 headings
+#   body    the text of the page, the title and headings included
+#   anchor  the anchor text of the links from other pages to the doc
+# the body tf is the tf less the title tf, the others are stored
+FIELDS = ("title", "heading", "body", "anchor")
+STORED_FIELDS = ("title", "heading", "anchor")
+
+INDEX_HEADER = struct.Struct("<4sIIIIQQI")
+DICT_ENTRY = struct.Struct("<IHQIQIdIId" + "II" * len(FIELDS) + "QI")
+DOCS_HEADER = struct.Struct("<4sIId" + "d" * len(FIELDS))
+DOC_OFFSET = struct.Struct("<Q")
+DOC_LENGTH = struct.Struct("<I")
+DOC_NORM = struct.Struct("<d")
+DOC_FIELDS = struct.Struct("<" + "I" * len(FIELDS))
+
+# a term found in at least one of BITMAP_DENSITY docs also gets a bitmap,
+# bit d of byte d / 8 is set when doc d has the term. The bitmap is at most
+# as large as the delta encoded doc ids then.
+BITMAP_DENSITY = 8
+
+
+def encodeVarint(n, out):
+    """
+        Append n to the bytearray out, 7 bits per byte.
+    """
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def decodeVarints(buf, count, pos=0):
+    """
+        Decode count varints from the bytearray buf starting at pos.
+
+        :return list of numbers, position after the last one
+    """
+    # the small numbers, as the tfs and the position deltas, are single
+    # bytes: take them without the loop
+    chunk = buf[pos:pos + count]
+    if count and len(chunk) == count and max(chunk) < 0x80:
+        return list(chunk), pos + count
+
+    values = []
+    for _ in range(count):
+        n = 0
+        shift = 0
+        while True:
+            b = buf[pos]
+            pos += 1
+            n |= (b & 0x7f) << shift
+            if b < 0x80:
+                break
+            shift += 7
+        values.append(n)
+
+    return values, pos
+
+
+def encodePostings(postings):
+    """
+        :param postings as list of (doc id, tf) sorted by doc id
+
+        :return bytearray of the delta encoded doc ids and the tfs
+    """
+    out = bytearray()
+    prev = 0
+    for doc_id, _ in postings:
+        encodeVarint(doc_id - prev, out)
+        prev = doc_id
+    for _, tf in postings:
+        encodeVarint(tf, out)
+
+    return out
+
+
+def skipVarints(buf, count, pos):
+    """
+        :return position after the count varints of the bytearray buf
+            starting at pos
+    """
+    chunk = buf[pos:pos + count]
+    if count and len(chunk) == count and max(chunk) < 0x80:
+        return pos + count
+
+    for _ in range(count):
+        while buf[pos] >= 0x80:
+            pos += 1
+        pos += 1
+
+    return pos
+
+
+def encodePositions(position_lists):
+    """
+        :param position_lists list of the sorted positions of every posting
+
+        :return bytearray of the position deltas of every posting, the
+            first position of a posting is the delta from 0
+    """
+    out = bytearray()
+    for positions in position_lists:
+        prev = 0
+        for p in positions:
+            encodeVarint(p - prev, out)
+            prev = p
+
+    return out
+
+
+def encodeFields(field_tfs, out):
+    """
+        Append the stored field tfs of the postings to the bytearray out.
+        Every posting has a varint with bit i set when stored field i has a
+        tf, followed by the tfs which are set.
+
+        :param field_tfs list of tuples of the STORED_FIELDS tfs
+    """
+    for tfs in field_tfs:
+        flags = 0
+        for i, tf in enumerate(tfs):
+            if tf:
+                flags |= 1 << i
+        encodeVarint(flags, out)
+
+        for tf in tfs:
+            if tf:
+                encodeVarint(tf, out)
+
+
+def decodeFields(buf, tfs, pos):
+    """
+        Decode the field tfs written by encodeFields, see _decode.
+
+        :return list of tuples of the FIELDS tfs
+    """
+    fields = []
+    for tf in tfs:
+        flags, pos = decodeVarints(buf, 1, pos)
+        stored = [0] * len(STORED_FIELDS)
+        if flags[0]:
+            for i in range(len(STORED_FIELDS)):
+                if flags[0] & (1 << i):
+                    value, pos = decodeVarints(buf, 1, pos)
+                    stored[i] = value[0]
+
+        fields.append(splitFields(tf, stored))
+
+    return fields
+
+
+def splitFields(tf, stored):
+    """
+        :param tf tf of a posting
+        :param stored the STORED_FIELDS tfs of the posting
+
+        :return tuple of the FIELDS tfs
+    """
+    title, heading, anchor = stored
+    return title, heading, max(tf - title, 0), anchor
+
+
+def fieldLengths(lengths, field_lengths):
+    """
+        The length of every field of every doc.
+
+        :param lengths array of the doc lengths indexed by doc id
+        :param field_lengths dictionary of the title, heading and anchor
+            field with the array of their lengths indexed by doc id
+
+        :return list of the arrays of the FIELDS lengths
+    """
+    def stored(field):
+        values = field_lengths.get(field)
+        if values is None:
+            return array('I', [0]) * len(lengths)
+        # the array of a field may not cover the doc ids assigned later
+        return values + array('I', [0]) * (len(lengths) - len(values))
+
+    title = stored("title")
+    body = array('I', (max(l - t, 0) for l, t in zip(lengths, title)))
+
+    return [title, stored("heading"), body, stored("anchor")]
+
+
+def encodeBitmap(doc_ids, num_docs):
+    """
+        :return bytearray of (num_docs + 7) / 8 bytes with the bits of the
+            doc ids set
+    """
+    bitmap = bytearray((num_docs + 7) // 8)
+    for doc_id in doc_ids:
+        bitmap[doc_id >> 3] |= 1 << (doc_id & 7)
+
+    return bitmap
+
+
+def _utf8(s):
+    if isinstance(s, bytes):
+        return s
+    return s.encode("utf-8")
+
+
+def writeIndex(index_data, num_indexed, lengths, index_file, field_data=None, field_lengths=None,
+               position_data=None, duplicates=None):
+    """
+        Write the vocabulary in the binary format. The file is written next
+        to the target and renamed into place.
+
+        The IDF of every term, log(N/df), is stored in the term dictionary
+        together with the upper bounds of the term's score contribution. The
+        TF-IDF vector length of every doc is calculated on the way. As they
+        depend on N and on every term of a doc, the whole vocabulary is read
+        and the file is written from scratch.
+
+        :param index_data as dictionary of term with dictionary of doc id and tf
+        :param num_indexed the number of indexed docs (N)
+        :param lengths array of the doc lengths indexed by doc id
+        :param index_file the path of the index file
+        :param field_data dictionary of the title, heading and anchor field
+            with its vocabulary, as index_data
+        :param field_lengths list of the arrays of the FIELDS lengths, see
+            fieldLengths
+        :param position_data dictionary of term with dictionary of doc id
+            and the positions of the term in the doc, tf positions per doc,
+            None for an index without positions
+        :param duplicates the doc ids of the duplicate docs, left out of the
+            postings, see dedup
+
+        :return array of the TF-IDF vector lengths indexed by doc id
+    """
+    logger.info("Saving binary index to file: %s", index_file)
+
+    field_data = field_data or {}
+    field_vocabularies = [field_data.get(field) or {} for field in STORED_FIELDS]
+    anchor_data = field_data.get("anchor") or {}
+    if field_lengths is None:
+        field_lengths = fieldLengths(lengths, {})
+
+    # postings and term dictionary, the terms are sorted by their bytes so
+    # the search can binary search them. The title and headings are part of
+    # the text, the anchor text adds the terms of the pages linking to a doc.
+    terms = sorted((_utf8(term), term) for term in set(index_data).union(anchor_data))
+
+    def docEntries(term):
+        """
+            :return the doc ids of the postings of the term, sorted, and the
+                dictionaries of doc id and tf of the term and of its stored
+                fields
+        """
+        doc_entry = index_data.get(term) or {}
+        field_entries = [vocabulary.get(term) or {} for vocabulary in field_vocabularies]
+
+        doc_ids = set(doc_entry)
+        doc_ids.update(anchor_data.get(term) or ())
+        if duplicates:
+            doc_ids.difference_update(duplicates)
+
+        return sorted(doc_ids), doc_entry, field_entries
+
+    # the doc vector lengths are needed for the weight upper bounds, so
+    # they are calculated before the postings are written. A term found
+    # only in duplicates has no postings and is dropped.
+    norms = array('d', [0.0]) * len(lengths)
+    indexed_terms = []
+    for term_bytes, term in terms:
+        doc_ids, doc_entry, _ = docEntries(term)
+        if not doc_ids:
+            continue
+
+        indexed_terms.append((term_bytes, term))
+        idf = math.log(num_indexed / float(len(doc_ids)))
+        for doc_id in doc_ids:
+            norms[doc_id] += (doc_entry.get(doc_id, 0) * idf) ** 2
+    norms = array('d', (math.sqrt(n) for n in norms))
+    terms = indexed_terms
+
+    entries = []
+    strings = bytearray()
+    with open(index_file + ".tmp", "wb") as fd:
+        fd.write(b"\0" * INDEX_HEADER.size)
+        offset = INDEX_HEADER.size
+
+        for term_bytes, term in terms:
+            doc_ids, doc_entry, field_entries = docEntries(term)
+            postings = [(doc_id, doc_entry.get(doc_id, 0)) for doc_id in doc_ids]
+            stored = [tuple(entry.get(doc_id, 0) for entry in field_entries) for doc_id in doc_ids]
+
+            data = encodePostings(postings)
+            encodeFields(stored, data)
+            fd.write(data)
+
+            bitmap_offset = 0
+            if len(postings) * BITMAP_DENSITY >= len(lengths):
+                bitmap_offset = offset + len(data)
+                bitmap = encodeBitmap(doc_ids, len(lengths))
+                fd.write(bitmap)
+                data += bitmap
+
+            idf = math.log(num_indexed / float(len(postings)))
+            max_tf = max(tf for _, tf in postings)
+            min_length = min(lengths[doc_id] for doc_id in doc_ids)
+            max_weight = max(tf * idf / norms[doc_id] if norms[doc_id] > 0 else 0.0
+                             for doc_id, tf in postings)
+
+            # the largest tf and the smallest length of every field, of the
+            # docs with the term in the field
+            field_tfs = [splitFields(tf, s) for (_, tf), s in zip(postings, stored)]
+            field_bounds = []
+            for i, lengths_of_field in enumerate(field_lengths):
+                in_field = [(tfs[i], lengths_of_field[doc_id]) for doc_id, tfs in zip(doc_ids, field_tfs) if tfs[i]]
+                field_bounds.append(max(tf for tf, _ in in_field) if in_field else 0)
+                field_bounds.append(min(length for _, length in in_field) if in_field else 0)
+
+            # the positions come from the text, a doc with the term only
+            # in its anchor text has none
+            positions_offset, positions_length = 0, 0
+            if position_data is not None:
+                doc_positions = position_data.get(term) or {}
+                position_lists = [doc_positions.get(doc_id, ()) if tf else () for doc_id, tf in postings]
+
+                # the search reads tf positions for every posting
+                for (doc_id, tf), doc_position_list in zip(postings, position_lists):
+                    if len(doc_position_list) != tf:
+                        raise ValueError("%d positions of %r in doc %d, its tf is %d"
+                                         % (len(doc_position_list), term, doc_id, tf))
+
+                positions = encodePositions(position_lists)
+                positions_offset, positions_length = offset + len(data), len(positions)
+                fd.write(positions)
+
+            entries.append(DICT_ENTRY.pack(len(strings), len(term_bytes), offset, len(data), bitmap_offset,
+                                           len(postings), idf, max_tf, min_length, max_weight,
+                                           *(field_bounds + [positions_offset, positions_length])))
+            strings += term_bytes
+            offset += len(data) + positions_length
+
+        dict_offset = offset
+        fd.write(b"".join(entries))
+        strings_offset = dict_offset + DICT_ENTRY.size * len(entries)
+        fd.write(strings)
+
+        fd.seek(0)
+        flags = FLAG_POSITIONS if position_data is not None else 0
+        fd.write(INDEX_HEADER.pack(INDEX_MAGIC, VERSION, len(terms), num_indexed, len(lengths),
+                                   dict_offset, strings_offset, flags))
+
+    os.rename(index_file + ".tmp", index_file)
+
+    return norms
+
+
+def writeDocTable(registry, norms, doc_file, field_lengths=None, duplicates=None):
+    """
+        Write the URL, title, length, TF-IDF vector length and field lengths
+        of every doc of the DocRegistry.
+
+        :param field_lengths list of the arrays of the FIELDS lengths, see
+            fieldLengths
+        :param duplicates the doc ids of the duplicate docs, not counted in
+            the average lengths
+    """
+    if field_lengths is None:
+        field_lengths = fieldLengths(registry.lengths, {})
+
+    duplicates = duplicates or {}
+    indexed = [h is not None and doc_id not in duplicates for doc_id, h in enumerate(registry.hashes)]
+    num_indexed = float(max(sum(indexed), 1))
+
+    def average(values):
+        return sum(v for v, i in zip(values, indexed) if i) / num_indexed
+
+    avg_length = average(registry.lengths)
+    avg_field_lengths = [average(values) for values in field_lengths]
+
+    strings = bytearray()
+    offsets = [0]
+    for url, title in zip(registry.urls, registry.titles):
+        strings += _utf8(url)
+        offsets.append(len(strings))
+        strings += _utf8(title or u"")
+        offsets.append(len(strings))
+
+    with open(doc_file + ".tmp", "wb") as fd:
+        fd.write(DOCS_HEADER.pack(DOCS_MAGIC, VERSION, len(registry), avg_length, *avg_field_lengths))
+        fd.write(b"".join(DOC_LENGTH.pack(l) for l in registry.lengths))
+        fd.write(b"".join(DOC_NORM.pack(n) for n in norms))
+        fd.write(b"".join(DOC_FIELDS.pack(*lengths) for lengths in zip(*field_lengths)))
+        fd.write(b"".join(DOC_OFFSET.pack(o) for o in offsets))
+        fd.write(strings)
+
+    os.rename(doc_file + ".tmp", doc_file)
+
+
+def _mapFile(file_name):
+    with open(file_name, "rb") as fd:
+        return mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class DocTable(object):
+    """
+        The memory mapped doc table, gives the URL, title, length, TF-IDF
+        vector length and field lengths of a doc id. doc_table[doc_id] is
+        the URL.
+    """
+
+    def __init__(self, doc_file):
+        self.mm = _mapFile(doc_file)
+
+        header = DOCS_HEADER.unpack_from(self.mm, 0)
+        magic, version, self.num_docs, self.avg_length = header[:4]
+        if magic != DOCS_MAGIC or version != VERSION:
+            raise IOError("Not a doc table file: " + doc_file)
+
+        # average length of every field of FIELDS
+        self.avg_field_lengths = header[4:]
+
+        self.norms_offset = DOCS_HEADER.size + DOC_LENGTH.size * self.num_docs
+        self.fields_offset = self.norms_offset + DOC_NORM.size * self.num_docs
+        self.offsets_offset = self.fields_offset + DOC_FIELDS.size * self.num_docs
+        self.strings_offset = self.offsets_offset + DOC_OFFSET.size * (2 * self.num_docs + 1)
+
+    def __len__(self):
+        return self.num_docs
+
+    def _string(self, n):
+        pos = self.offsets_offset + DOC_OFFSET.size * n
+        start, = DOC_OFFSET.unpack_from(self.mm, pos)
+        end, = DOC_OFFSET.unpack_from(self.mm, pos + DOC_OFFSET.size)
+
+        return self.mm[self.strings_offset + start:self.strings_offset + end].decode("utf-8")
+
+    def url(self, doc_id):
+        if doc_id < 0 or doc_id >= self.num_docs:
+            raise IndexError(doc_id)
+        return self._string(2 * doc_id)
+
+    def title(self, doc_id):
+        if doc_id < 0 or doc_id >= self.num_docs:
+            raise IndexError(doc_id)
+        return self._string(2 * doc_id + 1)
+
+    def length(self, doc_id):
+        if doc_id < 0 or doc_id >= self.num_docs:
+            raise IndexError(doc_id)
+        return DOC_LENGTH.unpack_from(self.mm, DOCS_HEADER.size + DOC_LENGTH.size * doc_id)[0]
+
+    def norm(self, doc_id):
+        if doc_id < 0 or doc_id >= self.num_docs:
+            raise IndexError(doc_id)
+        return DOC_NORM.unpack_from(self.mm, self.norms_offset + DOC_NORM.size * doc_id)[0]
+
+    def fieldLengths(self, doc_id):
+        """
+            :return tuple of the lengths of the FIELDS of the doc
+        """
+        if doc_id < 0 or doc_id >= self.num_docs:
+            raise IndexError(doc_id)
+        return DOC_FIELDS.unpack_from(self.mm, self.fields_offset + DOC_FIELDS.size * doc_id)
+
+    def __getitem__(self, doc_id):
+        return self.url(doc_id)
+
+    def close(self):
+        self.mm.close()
+
+
+class MappedIndex(object):
+    """
+        The memory mapped inverted index. Opening it reads only the header,
+        the postings of a term are decoded when the term is looked up.
+
+        get(term) gives the postings as a dictionary of doc id and tf, the
+        same as the vocabulary of the indexer.
+    """
+
+    def __init__(self, index_file, doc_file):
+        self.mm = _mapFile(index_file)
+
+        (magic, version, self.num_terms, self.num_docs, self.num_doc_ids,
+         self.dict_offset, self.strings_offset, flags) = INDEX_HEADER.unpack_from(self.mm, 0)
+        if magic != INDEX_MAGIC or version != VERSION:
+            raise IOError("Not an index file: " + index_file)
+
+        self.has_positions = bool(flags & FLAG_POSITIONS)
+
+        self.docs = DocTable(doc_file)
+
+        # set by the search to the generation the index was loaded as
+        self.generation = 0
+
+    def _entry(self, i):
+        return DICT_ENTRY.unpack_from(self.mm, self.dict_offset + DICT_ENTRY.size * i)
+
+    def _term(self, entry):
+        start = self.strings_offset + entry[0]
+        return self.mm[start:start + entry[1]]
+
+    def _find(self, term):
+        """
+            Binary search the term dictionary.
+
+            :return dictionary entry of the term or None
+        """
+        term = _utf8(term)
+        lo = 0
+        hi = self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            t = self._term(entry)
+            if t < term:
+                lo = mid + 1
+            elif t > term:
+                hi = mid
+            else:
+                return entry
+
+        return None
+
+    def _decode(self, entry, with_tfs, with_fields=False):
+        offset, df = entry[2], entry[5]
+        # the doc ids end before the tfs, at most 5 bytes per varint
+        length = entry[3] if with_tfs or with_fields else min(entry[3], 5 * df)
+        buf = bytearray(self.mm[offset:offset + length])
+
+        deltas, pos = decodeVarints(buf, df)
+
+        doc_ids = []
+        doc_id = 0
+        for d in deltas:
+            doc_id += d
+            doc_ids.append(doc_id)
+
+        if not with_tfs:
+            return doc_ids
+
+        tfs, pos = decodeVarints(buf, df, pos)
+        if not with_fields:
+            return doc_ids, tfs
+
+        return doc_ids, decodeFields(buf, tfs, pos)
+
+    def postings(self, term):
+        """
+            Decode the postings of a term.
+
+            :return list of integer doc ids in increasing order, list of tfs
+        """
+        entry = self._find(term)
+        if entry is None:
+            return [], []
+
+        return self._decode(entry, True)
+
+    def fieldPostings(self, term):
+        """
+            Decode the postings of a term with the tf of every field.
+
+            :return list of integer doc ids in increasing order, list of
+                tuples of the FIELDS tfs
+        """
+        entry = self._find(term)
+        if entry is None:
+            return [], []
+
+        return self._decode(entry, True, True)
+
+    def docIds(self, term):
+        """
+            Decode only the doc ids of the postings of a term.
+
+            :return list of integer doc ids in increasing order
+        """
+        entry = self._find(term)
+        if entry is None:
+            return []
+
+        return self._decode(entry, False)
+
+    def bitmap(self, term):
+        """
+            The bitmap of the docs of a frequent term, see BITMAP_DENSITY.
+
+            :return bytes of (num_doc_ids + 7) / 8 bytes or None
+        """
+        entry = self._find(term)
+        if entry is None or entry[4] == 0:
+            return None
+
+        offset = entry[4]
+        return self.mm[offset:offset + (self.num_doc_ids + 7) // 8]
+
+    def df(self, term):
+        entry = self._find(term)
+        if entry is None:
+            return 0
+        return entry[5]
+
+    def idf(self, term):
+        entry = self._find(term)
+        if entry is None:
+            return 0.0
+        return entry[6]
+
+    def bounds(self, term):
+        """
+            Upper bounds of the score contribution of a term.
+
+            :return largest tf, smallest doc length, largest tf * idf / norm
+                or None for an unknown term
+        """
+        entry = self._find(term)
+        if entry is None:
+            return None
+        return entry[7:10]
+
+    def fieldBounds(self, term):
+        """
+            Upper bounds of the field tfs of a term.
+
+            :return list of (largest tf, smallest field length) of the docs
+                with the term in the field, for every field of FIELDS, or
+                None for an unknown term
+        """
+        entry = self._find(term)
+        if entry is None:
+            return None
+        bounds = entry[10:10 + 2 * len(FIELDS)]
+        return list(zip(bounds[::2], bounds[1::2]))
+
+    def positions(self, term, doc_ids):
+        """
+            Decode the positions of a term in some of the docs of its
+            postings, the positions of the other docs are skipped.
+
+            :param doc_ids doc ids whose positions are needed
+            :return dictionary of doc id and the sorted positions of the
+                term in the doc, empty without positions
+        """
+        entry = self._find(term)
+        if entry is None or not self.has_positions:
+            return {}
+
+        offset, length = entry[-2:]
+        buf = bytearray(self.mm[offset:offset + length])
+        wanted = set(doc_ids)
+
+        positions = {}
+        pos = 0
+        for doc_id, tf in zip(*self._decode(entry, True)):
+            if not tf:
+                # a doc matching only by the anchor text has no positions
+                continue
+            if doc_id not in wanted:
+                pos = skipVarints(buf, tf, pos)
+                continue
+
+            doc_positions, pos = decodeVarints(buf, tf, pos)
+            for i in range(1, tf):
+                doc_positions[i] += doc_positions[i - 1]
+            positions[doc_id] = doc_positions
+            if len(positions) == len(wanted):
+                break
+
+        return positions
+
+    def get(self, term, default=None):
+        doc_ids, tfs = self.postings(term)
+        if not doc_ids:
+            return default
+
+        return dict(zip(doc_ids, tfs))
+
+    def __contains__(self, term):
+        return self._find(term) is not None
+
+    def has_key(self, term):
+        return term in self
+
+    def __iter__(self):
+        for i in range(self.num_terms):
+            yield self._term(self._entry(i)).decode("utf-8")
+
+    def __len__(self):
+        return self.num_terms
+
+    def close(self):
+        self.mm.close()
+        self.docs.close()
@@ -0,0 +1,327 @@
+"""
+    Speed and quality of the whole pipeline: builds an index with
+    indexer.process, runs a query set through search.search and reports
+
+        build time, index size and peak memory
+        query latency percentiles
+        MAP and nDCG against the relevance judgements (qrels)
+
+    Without --crawl a synthetic corpus with planted topics is generated,
+    together with its queries and qrels, so runs are comparable from commit
+    to commit. Save the summary with --output and compare a later run
+    against it with --baseline.
+
+    Usage:
+        python evaluate.py --output baseline.json
+        python evaluate.py --baseline baseline.json
+        python evaluate.py --crawl ksucs.json --queries queries.txt --qrels qrels.txt
+
+    A qrels line is "query_id 0 url grade" as in TREC, grade 0 is not
+    relevant.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import logging
+import string
+import tempfile
+import time
+
+import indexer
+import search
+from analyzer import getStopWordList
+from batchsearch import readQueries
+from diskindex import FIELDS
+from metrics import percentile
+
+# pages and topics of the synthetic corpus
+SYNTHETIC_PAGES = 2000
+SYNTHETIC_TOPICS = 50
+
+# the pickle files written by the indexer
+INDEX_PICKLES = ["doc_registry.pkl", "link_file.pkl", "anchor_file.pkl", "pagerank_file.pkl", "stem_cache.pkl"]
+
+# the segment directories written by the indexer
+INDEX_SEGMENTS = ["index_segments", "forward_segments", "title_segments", "heading_segments", "position_segments"]
+
+# number of results evaluated per query
+DEPTH = 100
+
+# cutoff of nDCG
+NDCG_CUTOFF = 10
+
+
+def writeSyntheticCorpus(directory, num_pages=SYNTHETIC_PAGES, num_topics=SYNTHETIC_TOPICS, seed=833):
+    """
+        Write a crawl file with planted topics, and the queries and qrels of
+        the topics. Every topic has two words which make its query. Of the
+        pages mentioning both words, the pages about the topic (grade 2) use
+        them most, the pages touching the topic (grade 1) a few times and
+        the other pages (grade 0) about as often in a longer text, so the
+        grades overlap as they do on real pages.
+
+        :return crawl file, queries file, qrels file
+    """
+    rnd = random.Random(seed)
+
+    def word():
+        return "".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(5, 9)))
+
+    vocabulary = [word() for _ in range(5000)]
+    topics = [(word(), word()) for _ in range(num_topics)]
+
+    def text(length):
+        # Zipfian background text
+        return [vocabulary[min(int(rnd.paretovariate(1.1)) - 1, len(vocabulary) - 1)] for _ in range(length)]
+
+    crawl_file = os.path.join(directory, "synthetic.json")
+    queries_file = os.path.join(directory, "synthetic_queries.txt")
+    qrels_file = os.path.join(directory, "synthetic_qrels.txt")
+
+    qrels = []
+    with open(crawl_file, "w") as fd:
+        for i in range(num_pages):
+            url = "http://www.cs.ksu.edu/synthetic/%d" % i
+            words = text(rnd.randint(50, 300))
+            title = " ".join(text(3))
+
+            if rnd.random() < 0.5:
+                t = rnd.randrange(num_topics)
+                grade = rnd.choice([0, 1, 2])
+                mentions = rnd.randint(*{0: (1, 3), 1: (1, 4), 2: (3, 8)}[grade])
+                if grade == 0:
+                    words += text(rnd.randint(0, 400))
+                if grade == 2 and rnd.random() < 0.5:
+                    title = " ".join(topics[t])
+                for _ in range(mentions):
+                    for w in topics[t]:
+                        words.insert(rnd.randrange(len(words) + 1), w)
+                qrels.append((t, url, grade))
+
+            links = ["http://www.cs.ksu.edu/synthetic/%d" % rnd.randrange(num_pages) for _ in range(rnd.randint(0, 8))]
+            html = "<html><head><title>%s</title></head><body><p>%s</p></body></html>" % (title, " ".join(words))
+            fd.write(json.dumps({"page_url": url, "page_title": title, "page_content": html,
+                                 "page_links": links}) + "\n")
+
+    with open(queries_file, "w") as fd:
+        for t, (a, b) in enumerate(topics):
+            fd.write("t%d\t%s %s\n" % (t, a, b))
+
+    with open(qrels_file, "w") as fd:
+        for t, url, grade in qrels:
+            fd.write("t%d 0 %s %d\n" % (t, url, grade))
+
+    return crawl_file, queries_file, qrels_file
+
+
+def readQrels(qrels_file):
+    """
+        :return dictionary of query id with dictionary of URL and grade
+    """
+    qrels = {}
+    with open(qrels_file, "r") as fd:
+        for line in fd:
+            fields = line.split()
+            if len(fields) != 4:
+                continue
+            query_id, _, url, grade = fields
+            qrels.setdefault(query_id, {})[url] = int(grade)
+
+    return qrels
+
+
+def averagePrecision(ranked, grades):
+    """
+        :param ranked list of URLs, best first
+        :param grades dictionary of URL and grade
+
+        :return average precision, a grade above 0 is relevant
+    """
+    relevant = sum(1 for g in grades.values() if g > 0)
+    if relevant == 0:
+        return 0.0
+
+    hits = 0
+    total = 0.0
+    for i, url in enumerate(ranked):
+        if grades.get(url, 0) > 0:
+            hits += 1
+            total += hits / float(i + 1)
+
+    return total / relevant
+
+
+def ndcg(ranked, grades, cutoff=NDCG_CUTOFF):
+    """
+        :param ranked list of URLs, best first
+        :param grades dictionary of URL and grade
+
+        :return normalized discounted cumulative gain at cutoff
+    """
+    def dcg(gains):
+        return sum((2 ** g - 1) / math.log(i + 2, 2) for i, g in enumerate(gains))
+
+    ideal = dcg(sorted(grades.values(), reverse=True)[:cutoff])
+    if ideal == 0:
+        return 0.0
+
+    return dcg([grades.get(url, 0) for url in ranked[:cutoff]]) / ideal
+
+
+def directorySize(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            size += os.path.getsize(os.path.join(root, f))
+    return size
+
+
+def peakMemory():
+    """
+        :return peak resident memory in MB of this process and of its
+            finished child processes
+    """
+    # ru_maxrss is in KB on Linux
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0)
+
+
+def buildIndex(crawl_file, work_dir, workers=1, positions=False):
+    """
+        Index the crawl in work_dir.
+
+        :param positions True to store the positions of the words
+
+        :return dictionary of build time and index sizes
+    """
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        start = time.time()
+        indexer.process(crawl_file, workers, positions=positions)
+        build_time = time.time() - start
+    finally:
+        os.chdir(cwd)
+
+    def size(name):
+        path = os.path.join(work_dir, name)
+        return directorySize(path) if os.path.isdir(path) else os.path.getsize(path)
+
+    sizes = {
+        "index_bin_bytes": size("index.bin"),
+        "docs_bin_bytes": size("docs.bin"),
+        "segments_bytes": sum(size(d) for d in INDEX_SEGMENTS if os.path.exists(os.path.join(work_dir, d))),
+        "pickles_bytes": sum(size(f) for f in INDEX_PICKLES),
+    }
+    sizes["total_bytes"] = sum(sizes.values())
+    sizes["build_seconds"] = build_time
+
+    return sizes
+
+
+def runQueries(work_dir, queries, qrels, model, depth, stop_word_list, boosts=None):
+    """
+        Search every query and judge the results.
+
+        :return dictionary of the latency and relevance figures
+    """
+    index_data, pagerank_data = search.loadData(work_dir)
+
+    latencies = []
+    ap = []
+    gains = []
+    for query_id, query in queries:
+        start = time.time()
+        _, vector_ranked, _ = search.search(index_data, pagerank_data, stop_word_list, query,
+                                            model, depth, verbose=False, boosts=boosts)
+        latencies.append(time.time() - start)
+
+        if query_id in qrels:
+            ranked = [index_data.docs.url(doc) for doc in vector_ranked]
+            ap.append(averagePrecision(ranked, qrels[query_id]))
+            gains.append(ndcg(ranked, qrels[query_id]))
+
+    index_data.close()
+
+    return {
+        "queries": len(queries),
+        "judged_queries": len(ap),
+        "latency_mean_ms": 1000 * sum(latencies) / max(len(latencies), 1),
+        "latency_p50_ms": 1000 * percentile(latencies, 50),
+        "latency_p90_ms": 1000 * percentile(latencies, 90),
+        "latency_p99_ms": 1000 * percentile(latencies, 99),
+        "map": sum(ap) / len(ap) if ap else 0.0,
+        "ndcg@%d" % NDCG_CUTOFF: sum(gains) / len(gains) if gains else 0.0,
+    }
+
+
+def printSummary(summary, baseline=None):
+    for key in sorted(summary):
+        value = summary[key]
+        line = "%-20s %14s" % (key, "%.4f" % value if isinstance(value, float) else value)
+        if baseline is not None and isinstance(value, (int, float)) and baseline.get(key):
+            line += " %+9.1f%%" % (100.0 * (value - baseline[key]) / baseline[key])
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the speed and quality of the search")
+    parser.add_argument("--crawl", help="JSON lines crawl file, a synthetic corpus by default")
+    parser.add_argument("--queries", help="query file of batchsearch.py")
+    parser.add_argument("--qrels", help="relevance judgements, query_id 0 url grade per line")
+    parser.add_argument("--pages", type=int, default=SYNTHETIC_PAGES, help="pages of the synthetic corpus")
+    parser.add_argument("--work-dir", help="directory of the index, a temporary directory by default")
+    parser.add_argument("--workers", type=int, default=1, help="indexer worker processes")
+    parser.add_argument("--positions", action="store_true", help="index the positions of the words")
+    parser.add_argument("--model", default=search.DEFAULT_MODEL, choices=search.RANKING_MODELS)
+    parser.add_argument("--boosts", type=search.parse_boosts, help="field boosts of bm25f, e.g. title:3,anchor:2")
+    parser.add_argument("--depth", type=int, default=DEPTH, help="results evaluated per query")
+    parser.add_argument("--stop-words", default="stopwords.txt")
+    parser.add_argument("--output", help="write the summary as JSON to this file")
+    parser.add_argument("--baseline", help="summary JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    # only the problems of the indexer, not its progress
+    logging.basicConfig(level=logging.WARNING)
+
+    work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix="cssearch-eval-"))
+    if not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+
+    # the indexer reads the stop words from its working directory
+    shutil.copy(args.stop_words, os.path.join(work_dir, "stopwords.txt"))
+
+    if args.crawl:
+        crawl_file, queries_file, qrels_file = os.path.abspath(args.crawl), args.queries, args.qrels
+    else:
+        crawl_file, queries_file, qrels_file = writeSyntheticCorpus(work_dir, args.pages)
+
+    summary = {"model": args.model}
+    if args.model == "bm25f":
+        summary["boosts"] = ",".join("%s:%g" % e for e in zip(FIELDS, search.field_boosts(args.boosts)))
+    summary.update(buildIndex(crawl_file, work_dir, args.workers, args.positions))
+
+    if queries_file:
+        qrels = readQrels(qrels_file) if qrels_file else {}
+        summary.update(runQueries(work_dir, readQueries(queries_file), qrels, args.model, args.depth,
+                                  getStopWordList(args.stop_words), args.boosts))
+
+    summary["peak_memory_mb"], summary["peak_worker_memory_mb"] = peakMemory()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as fd:
+            baseline = json.load(fd)
+
+    printSummary(summary, baseline)
+
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(summary, fd, indent=2, sort_keys=True)
+
+    if not args.work_dir:
+        shutil.rmtree(work_dir)
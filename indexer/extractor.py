@@ -0,0 +1,251 @@
+"""
+    Text extraction from the crawled HTML pages.
+
+    Backends:
+        lxml        the lxml C parser calling a parser target, no tree is built
+        htmlparser  the standard library HTMLParser, streaming
+        bs4         BeautifulSoup with html.parser, the original extractor
+
+    The default is lxml when it is installed, else htmlparser. A page the
+    chosen backend fails on is extracted with bs4.
+
+    Every backend gives the same text: the strings of the page outside
+    script and style joined by a space, as BeautifulSoup's get_text(' ').
+    The CDATA sections are not text in HTML and the parsers disagree on
+    them, they are replaced by a space before the parsing.
+"""
+try:
+    from HTMLParser import HTMLParser
+    from htmlentitydefs import name2codepoint
+except ImportError:
+    from html.parser import HTMLParser
+    from html.entities import name2codepoint
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+import collections
+import logging
+import re
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("lxml", "htmlparser", "bs4")
+DEFAULT_BACKEND = "lxml" if etree is not None else "htmlparser"
+
+# the content of these tags is not text
+SKIP_TAGS = frozenset(["script", "style"])
+
+HEADING_TAGS = frozenset(["h1", "h2", "h3", "h4", "h5", "h6"])
+
+# a CDATA section, with its content
+CDATA_RE = re.compile(u"<!\\[CDATA\\[.*?\\]\\]>", re.DOTALL)
+CDATA_BYTES_RE = re.compile(b"<!\\[CDATA\\[.*?\\]\\]>", re.DOTALL)
+
+# title: the first title of the page
+# text: all the text of the page, the title included
+# headings: list of the heading texts
+# anchors: list of (href, anchor text) of the links
+ExtractedPage = collections.namedtuple("ExtractedPage", ["title", "text", "headings", "anchors"])
+
+
+class TextCollector(object):
+    """
+        Collect the text, title, headings and anchors from parser events,
+        the target of the lxml and htmlparser backends.
+
+        The data between two tags is one string, as a NavigableString of
+        BeautifulSoup, even if the parser delivers it in pieces.
+    """
+
+    def __init__(self):
+        self.pieces = []
+        self.buffer = []
+        self.skip = 0
+
+        self.title = None
+        self.title_pieces = None
+        self.headings = []
+        self.heading = None
+        self.anchors = []
+        self.anchor = None
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        text = u"".join(self.buffer)
+        self.buffer = []
+
+        self.pieces.append(text)
+        if self.title_pieces is not None:
+            self.title_pieces.append(text)
+        if self.heading is not None:
+            self.heading.append(text)
+        if self.anchor is not None:
+            self.anchor[1].append(text)
+
+    def start(self, tag, attrib):
+        self.flush()
+
+        if tag in SKIP_TAGS:
+            self.skip += 1
+        elif tag == "title":
+            if self.title is None:
+                self.title_pieces = []
+        elif tag in HEADING_TAGS:
+            self.heading = []
+        elif tag == "a":
+            self.anchor = (attrib.get("href"), [])
+
+    def end(self, tag):
+        self.flush()
+
+        if tag in SKIP_TAGS:
+            self.skip = max(self.skip - 1, 0)
+        elif tag == "title":
+            if self.title_pieces is not None:
+                self.title = u"".join(self.title_pieces)
+                self.title_pieces = None
+        elif tag in HEADING_TAGS:
+            if self.heading is not None:
+                self.headings.append(u" ".join(self.heading))
+                self.heading = None
+        elif tag == "a":
+            if self.anchor is not None:
+                href, text = self.anchor
+                if href:
+                    self.anchors.append((href, u" ".join(text)))
+                self.anchor = None
+
+    def data(self, data):
+        if not self.skip:
+            self.buffer.append(data)
+
+    def comment(self, text):
+        self.flush()
+
+    def close(self):
+        self.flush()
+        return ExtractedPage(self.title or u"", u" ".join(self.pieces), self.headings, self.anchors)
+
+
+class StreamingParser(HTMLParser):
+    """
+        HTMLParser passing its events to a TextCollector.
+    """
+
+    def __init__(self, target):
+        HTMLParser.__init__(self)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+        self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+    def handle_entityref(self, name):
+        codepoint = name2codepoint.get(name)
+        self.target.data(unichr(codepoint) if codepoint is not None else u"&%s;" % name)
+
+    def handle_charref(self, name):
+        try:
+            codepoint = int(name[1:], 16) if name[:1] in "xX" else int(name)
+            self.target.data(unichr(codepoint))
+        except (ValueError, OverflowError):
+            self.target.data(u"&#%s;" % name)
+
+    def handle_comment(self, data):
+        self.target.comment(data)
+
+
+def extractLxml(data):
+    parser = etree.HTMLParser(target=TextCollector())
+    parser.feed(data)
+    return parser.close()
+
+
+def extractHTMLParser(data):
+    target = TextCollector()
+    parser = StreamingParser(target)
+    parser.feed(data)
+    parser.close()
+    return target.close()
+
+
+def extractBs4(data):
+    soup = BeautifulSoup(data, 'html.parser')
+
+    # remove Scripts and CSS
+    # Ref: https://stackoverflow.com/a/35565549
+    for tag in soup.find_all(list(SKIP_TAGS)):
+        tag.decompose()
+
+    try:
+        title = soup.title.get_text()
+    except AttributeError:
+        title = u""
+
+    headings = [h.get_text(' ') for h in soup.find_all(sorted(HEADING_TAGS))]
+    anchors = [(a["href"], a.get_text(' ')) for a in soup.find_all("a", href=True) if a["href"]]
+
+    # Get the text between all tags joined by a space character
+    return ExtractedPage(title, soup.get_text(' '), headings, anchors)
+
+
+def removeCData(data):
+    """
+        Replace the CDATA sections of the page by a space.
+    """
+    if isinstance(data, bytes):
+        return CDATA_BYTES_RE.sub(b" ", data) if b"<![CDATA[" in data else data
+
+    return CDATA_RE.sub(u" ", data) if u"<![CDATA[" in data else data
+
+
+EXTRACTORS = {
+    "lxml": extractLxml,
+    "htmlparser": extractHTMLParser,
+    "bs4": extractBs4,
+}
+
+
+def extractPage(data, backend=None):
+    """
+        Extract the text of a HTML page.
+
+    :param data: HTML of the page
+    :param backend: one of BACKENDS, None for DEFAULT_BACKEND
+
+    :return: ExtractedPage
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend == "lxml" and etree is None:
+        raise ValueError("lxml is not installed")
+
+    data = removeCData(data)
+
+    if backend != "bs4":
+        try:
+            return EXTRACTORS[backend](data)
+        except Exception as e:
+            logger.debug("%s failed, extracting with bs4: %s", backend, e)
+
+    return extractBs4(data)
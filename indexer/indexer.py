@@ -3,41 +3,76 @@ try:
 except:
     import pickle
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import argparse
+import collections
+import cProfile
+import glob
+import gzip
+import io
 import json
-import string
 import hashlib
+import logging
+import multiprocessing
+import os
+import pstats
+import time
+from array import array
 
 from sets import Set
 
-from bs4 import BeautifulSoup
+from analyzer import getStopWordList, sanitize, stem_cache
+from canonical import canonicalize_url
+from dedup import canonicalLinks, findDuplicates, fingerprint
+from diskindex import fieldLengths, writeDocTable, writeIndex
+from extractor import BACKENDS, DEFAULT_BACKEND, extractPage
+from metrics import PhaseStats
+from pagerank import EPSILON, build_link_graph, pagerank
+from registry import DocRegistry
+from segments import SegmentedDict
 
-from stemming.porter import stem
-from nltk.corpus import stopwords
+# number of pages sent to a worker process at a time
+CHUNK_SIZE = 64
 
-def getHash(url):
-    """
-        return the SAH256 hash of the URL
+# number of pages between two progress reports
+PROGRESS_INTERVAL = 1000
 
-        :param url as string
-        :return sha256 has as string
-    """
-    #return hashlib.sha256(url).hexdigest()
+# the fields of a page with their own vocabulary, the anchor field is built
+# from the anchor text of the links at the end of every run
+PAGE_FIELDS = ("title", "heading")
+
+# stop-words, content hashes, extractor backend and positions setting of
+# the worker process, set by initWorker
+worker_stop_word_list = None
+worker_content_hashes = None
+worker_extractor = None
+worker_positions = False
 
-    # NOTE: debugging
-    return url
+logger = logging.getLogger(__name__)
 
+# time spent in each phase of the indexing and the counters of the run
+stats = PhaseStats()
 
 def savePickle(pickle_file, data):
     """
         Save data in Pickle format. The file contents are over-written.
     """
-    print("Saving pickle data to file: "+pickle_file)
+    logger.info("Saving pickle data to file: %s", pickle_file)
 
     try:
         with open(pickle_file, "wb") as fd:
             pickle.dump(data, fd)            
     except pickle.PicklingError as pe:
-        print("Failed: Saving pickle data")
+        logger.error("Failed: Saving pickle data")
         return 1
 
 
@@ -45,7 +80,7 @@ def loadPickle(pickle_file):
     """
         Load the Pickle data from file.
     """
-    print("Loading pickle data from file: "+pickle_file)
+    logger.info("Loading pickle data from file: %s", pickle_file)
 
     data = None
     try:
@@ -54,135 +89,26 @@ def loadPickle(pickle_file):
     except EOFError:
         pass
     except pickle.UnpicklingError as upe:
-        print("Failed: Loading Pickle Data")
+        logger.error("Failed: Loading Pickle Data")
     except IOError:
         data = {}
 
     return data
 
-def stemm_word(word):
-    """
-        Use Porter stemmer to stem words.
-
-    :param word: String
-
-    :return: Stemmed word
-    """
-    return stem(word)
-
-def getStopWordList(stop_word_list_file_path=None):
-    
-    stop_word_list = None
-
-    if stop_word_list_file_path == None:
-        stop_word_list = set(stopwords.words('english'))
-    else:
-        fd = open(stop_word_list_file_path, "r")
-        txt = fd.readlines()
-        fd.close()
-
-        stop_word_list = []
-        for l in txt:
-            stop_word_list.append(l.lstrip().rstrip())
-
-    return stop_word_list
-
-def parseSGML(data):
+def parseSGML(data, extractor=None):
     """
         Reads a SGML data and return the TITLE and TEXT
 
     :param data: SGML data
+    :param extractor: extractor backend, see extractor.BACKENDS
 
     :return:
         title as string
         contents as string
     """
-    
-    soup = BeautifulSoup(data, 'html.parser')
-
-    # remove Scripts and CSS
-    # Ref: https://stackoverflow.com/a/35565549
-    tags_to_remove = ['script', 'style']
-    for tag in soup.find_all(tags_to_remove):
-        tag.decompose()
-
-    try:
-        title = soup.title.get_text()
-    except AttributeError:
-        title = ""
-
-    # Get the text between all tags joined by a space character
-    contents = soup.get_text(' ')
-
-    #print("Title:", title)
-    #print("Text:", contents)
-
-    return title, contents
-
-def sanitize(text, stop_word_list):
-    """
-        Reads a text, remove stop words, stem the words.
-
-    :param text: String
-
-    :return: List of words
-    """
-
-    # convert the text into Unicode
-    text = unicode(text)
+    page = extractPage(data, extractor)
 
-    #print(type(text))
-
-    # replace dot with space
-    text = text.translate({ord("."): ord(" ")})
-    # replace dash with space
-    text = text.translate({ord("-"): ord(" ")})
-
-    # split the text on white-space
-    words = text.split()
-    sanitized_words = []
-    for w in words:
-
-        # ignore numbers
-        if w.isnumeric():
-            continue
-
-        # print("Word (Before Punctuation): " + w)
-
-        # remove punctuation
-        # Ref: https://stackoverflow.com/questions/265960/best-way-to-strip-punctuation-from-a-string-in-python
-        # w = w.translate(None, string.punctuation)
-
-        # The above method does not work for Unicode strings
-        # Ref: https://stackoverflow.com/questions/23175809/typeerror-translate-takes-one-argument-2-given-python#23306505
-        # print(type(w))
-
-        # replace punctuations with None
-        w = w.translate({ord(c): None for c in string.punctuation})
-        w = w.lower()
-        # print("Word (After Punctuation): "+w)
-
-        # Note: Remove stop-words before Stemming, or else the stop-word
-        # matching will not work.
-        # If the word is in Stop Word List
-        try:
-            i = stop_word_list.index(w.lower())
-            # skip further processing of word loop
-            # print("Stop Word Removed: "+w)
-            continue
-        except ValueError:
-            pass
-
-        w = stemm_word(w)
-
-        # hack, hack, hack
-        if w == '':
-            continue
-
-        # add the sanitized word into return list
-        sanitized_words.append(w)
-
-    return sanitized_words
+    return page.title, page.text
 
 def includeInVocabulary(vocabulary, doc_id, words):
     """
@@ -222,132 +148,941 @@ def includeInVocabulary(vocabulary, doc_id, words):
 
     return vocabulary
 
-def updateLinksData(src_url, outgoing_links, link_data):
+def mergeVocabulary(vocabulary, partial_vocabulary):
     """
-        Keep a data structure of source links to destinations links.
+        Add a partial vocabulary built by a worker into our vocabulary.
+
+        Merging the partial vocabularies in page order gives the same
+        vocabulary as calling includeInVocabulary page by page.
+
+    :param vocabulary A dictionary of words and docs which contain the word
+    :param partial_vocabulary: List of (word, [(doc_id, tf)]), words and docs
+        in the order they were first seen
+
+    :return: Updated document index
+    """
+    for w, postings in partial_vocabulary:
+        if not postings:
+            continue
+
+        doc_entry = vocabulary.get(w)
+        if doc_entry is None:
+            doc_entry = {}
+
+        for doc_id, tf in postings:
+            doc_entry[doc_id] = doc_entry.get(doc_id, 0) + tf
+
+        vocabulary[w] = doc_entry
+
+    return vocabulary
+
+def removePostings(vocabulary, doc_id, terms):
+    """
+        Remove the postings of a document for the given terms.
+    """
+    for w in terms:
+        doc_entry = vocabulary.get(w)
+        if doc_entry is None or doc_id not in doc_entry:
+            continue
 
-        :param source page URL
+        del doc_entry[doc_id]
+        if doc_entry:
+            vocabulary[w] = doc_entry
+        else:
+            del vocabulary[w]
+
+def removeDocument(vocabulary, forward_data, doc_id, field_data=None, position_data=None):
+    """
+        Subtract the postings of a previously indexed document from the
+        vocabulary, the field vocabularies and the positions, using its
+        forward record.
+
+    :param vocabulary A dictionary of words and docs which contain the word
+    :param forward_data: A dictionary of doc_id and its forward record
+    :param doc_id: Document ID
+    :param field_data: A dictionary of field name and its vocabulary
+    :param position_data: A dictionary of words and the positions in the docs
+
+    :return: Updated document index
+    """
+    record = forward_data.get(doc_id)
+    if record is None:
+        return vocabulary
+
+    removePostings(vocabulary, doc_id, record["terms"])
+
+    if position_data is not None:
+        removePostings(position_data, doc_id, record["terms"])
+
+    if field_data is not None:
+        for field, terms in record.get("fields", {}).items():
+            if field in field_data:
+                removePostings(field_data[field], doc_id, terms)
+
+    return vocabulary
+
+def deletePage(url, registry, vocabulary, forward_data, field_data, position_data, link_data, anchor_data):
+    """
+        Remove a page which is gone from the site, on a tombstone of the
+        crawler. The postings, the links and the anchors of the page are
+        removed, its doc id stays for the links to it.
+
+    :param url: URL of the page
+    :param registry: DocRegistry of the docs
+
+    :return: True when the page was indexed
+    """
+    doc_id = registry.lookup(url)
+    if registry.contentHash(doc_id) is None:
+        return False
+
+    removeDocument(vocabulary, forward_data, doc_id, field_data, position_data)
+    if doc_id in forward_data:
+        del forward_data[doc_id]
+
+    registry.removeDocument(doc_id)
+    link_data.pop(doc_id, None)
+    anchor_data.pop(doc_id, None)
+
+    return True
+
+def countTerms(words):
+    """
+        :return dictionary of word and tf
+    """
+    term_counts = {}
+    for w in words:
+        term_counts[w] = term_counts.get(w, 0) + 1
+    return term_counts
+
+def termPositions(words):
+    """
+        :return dictionary of word and the list of its positions in words
+    """
+    positions = {}
+    for i, w in enumerate(words):
+        positions.setdefault(w, []).append(i)
+    return positions
+
+def includePositions(position_data, doc_id, term_positions):
+    """
+        Add the positions of the words of a document.
+
+    :param position_data: A dictionary of words and the positions in the docs
+        {word:
+            {doc_id: [position]}
+        }
+    :param doc_id: Document ID
+    :param term_positions: A dictionary of word and its positions in the doc
+    """
+    for w, positions in term_positions.items():
+        doc_entry = position_data.get(w)
+        if doc_entry is None:
+            doc_entry = {}
+
+        doc_entry[doc_id] = positions
+        position_data[w] = doc_entry
+
+def updateDocument(vocabulary, forward_data, doc_id, words, field_data=None, fields=None, position_data=None):
+    """
+        Replace the postings of a document with the words of its new
+        version and update its forward record.
+
+    :param vocabulary A dictionary of words and docs which contain the word
+    :param forward_data: A dictionary of doc_id and its forward record
+        {doc_id:
+            {"terms": {word: tf},
+             "fields": {field: {word: tf}}}
+        }
+    :param doc_id: Document ID
+    :param words: List of words of the page
+    :param field_data: A dictionary of field name and its vocabulary
+    :param fields: A dictionary of field name and the list of its words
+    :param position_data: A dictionary of words and the positions in the
+        docs, None when the index has no positions
+
+    :return: Updated document index
+    """
+    removeDocument(vocabulary, forward_data, doc_id, field_data, position_data)
+    includeInVocabulary(vocabulary, doc_id, words)
+
+    if position_data is not None:
+        includePositions(position_data, doc_id, termPositions(words))
+
+    record = {"terms": countTerms(words), "fields": {}}
+    for field, field_words in (fields or {}).items():
+        includeInVocabulary(field_data[field], doc_id, field_words)
+        record["fields"][field] = countTerms(field_words)
+    forward_data[doc_id] = record
+
+    return vocabulary
+
+def pageUrl(webpage_data):
+    """
+        Canonical URL of a scrapped page. The crawler writes canonical URLs,
+        the older crawls have the URLs as they were requested.
+    """
+    url = webpage_data["page_url"]
+    return canonicalize_url(url) or url
+
+def updateLinksData(src_id, outgoing_links, link_data, registry):
+    """
+        Keep a data structure of source links to destinations links, by
+        their doc ids.
+
+        :param src_id doc id of the source page
         :param outgoing_links as link of URLs
         :param link_data as dictionary of links with their own link of outgoing links
+        :param registry DocRegistry giving the doc ids of the URLs
 
-        {src_link: 
-            Set(dest_link)
+        {src_id:
+            [dest_id]
         }
     """
 
     #print(outgoing_links)
 
+    # checked once, the loop costs nothing extra without debug logging
+    debug = logger.isEnabledFor(logging.DEBUG)
+
     new_link_set = Set()
     # for each new link in the list
     for l in outgoing_links:
-        # URL must start with HTTP
-        if l[:4] == "http":
+        # URL must be HTTP, canonical as the page URLs and the anchors
+        url = canonicalize_url(l)
+        if url is not None:
             # add the link to the set of links
-            new_link_set.add(l)
-            print("Adding to link_data: "+l)
-
-    if link_data.has_key(src_url):
-        # get the link entry
-        link_set = link_data.get(src_url)  
-        # take the union of the link sets and save it back    
-        new_link_set = link_set | new_link_set
-        
-    
-    # the source URL does not exists, create a new entry
-    link_data[src_url] = list(new_link_set)
+            new_link_set.add(registry.getId(url))
+            if debug:
+                logger.debug("Adding to link_data: %s", url)
+
+    stats.count("links", len(new_link_set))
+
+    # a re-crawled page replaces the links of its previous crawl
+    link_data[src_id] = list(new_link_set)
 
     return link_data
 
-def process(scrapped_data_file):
+def updateAnchorData(src_id, anchors, anchor_data, registry):
+    """
+        Keep the anchor text of the links of a page, by the doc ids of the
+        linked pages. Call it after updateLinksData, an anchor whose URL has
+        no doc id and a link of a page to itself are dropped.
+
+        :param src_id doc id of the source page
+        :param anchors list of (URL, list of words) of the anchors of the page
+        :param anchor_data as dictionary of doc id with the anchors of the page
+        :param registry DocRegistry giving the doc ids of the URLs
+
+        {src_id:
+            [(dest_id, {word: tf})]
+        }
+    """
+    page_anchors = []
+    for url, words in anchors:
+        dest_id = registry.lookup(url)
+        if dest_id is None or dest_id == src_id:
+            continue
+        page_anchors.append((dest_id, countTerms(words)))
+
+    # a re-crawled page replaces the anchors of its previous crawl
+    anchor_data[src_id] = page_anchors
+
+    return anchor_data
+
+def buildAnchorVocabulary(anchor_data, registry, duplicates=None):
+    """
+        Gather the anchor text of the links to every indexed doc into the
+        vocabulary of the anchor field.
+
+        The anchors of a duplicate page repeat the ones of its canonical doc
+        and are skipped, the anchor text of the links to a duplicate goes to
+        its canonical doc.
+
+        :param anchor_data as dictionary of doc id with the anchors of the page
+        :param registry DocRegistry of the docs
+        :param duplicates dictionary of duplicate and canonical doc id
+
+        :return dictionary of word with dictionary of doc id and tf, array
+            of the anchor text lengths indexed by doc id
+    """
+    duplicates = duplicates or {}
+
+    vocabulary = {}
+    lengths = array('I', [0]) * len(registry)
+    for src_id in sorted(anchor_data):
+        if src_id in duplicates:
+            continue
+
+        for dest_id, term_counts in anchor_data[src_id]:
+            # a link to a page which was not crawled
+            if registry.contentHash(dest_id) is None:
+                continue
+
+            # a link to a copy of the page itself
+            dest_id = duplicates.get(dest_id, dest_id)
+            if dest_id == src_id:
+                continue
+
+            for w, tf in term_counts.items():
+                doc_entry = vocabulary.setdefault(w, {})
+                doc_entry[dest_id] = doc_entry.get(dest_id, 0) + tf
+                lengths[dest_id] += tf
+
+    return vocabulary, lengths
+
+def computePageRank(link_data, num_docs, epsilon=EPSILON):
+    """
+        Calculate the static PageRank of every doc.
+
+        :param link_data as dictionary of links with their own link of outgoing links
+        :param num_docs the number of doc ids
+        :param epsilon the teleport probability
+
+        :return array of scores indexed by doc id
+    """
+    # node i of the graph is doc id i
+    graph = build_link_graph(link_data, range(num_docs))
+
+    return pagerank(graph, epsilon)
+
+def expandScrappedDataFiles(patterns):
+    """
+        Expand the glob patterns into the list of scrapped data files.
+
+    :param patterns: List of file names or glob patterns
+
+    :return: List of file names, in the order given
+    """
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise IOError("No such file: " + pattern)
+        files.extend(matches)
+
+    return files
+
+def openScrappedDataFile(file_name):
+    """
+        Open a scrapped data file for reading, gzip (.gz) and zstd (.zst)
+        compressed files are decompressed on the fly.
+    """
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "rb")
+
+    if file_name.endswith(".zst"):
+        if zstandard is None:
+            raise IOError("zstandard package is needed to read " + file_name)
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file_name, "rb"))
+        return io.BufferedReader(reader)
+
+    return open(file_name, "rb")
+
+def readScrappedData(file_names):
+    """
+        Read the scrapped data files one line (web page) at a time, so only
+        the page being indexed is kept in memory.
+
+    :param file_names: List of file names
+
+    :return: generator of JSON lines
+    """
+    for file_name in file_names:
+        fd = openScrappedDataFile(file_name)
+        try:
+            for data in fd:
+                if data.strip():
+                    yield data
+        finally:
+            fd.close()
+
+class Progress(object):
+    """
+        Report the number of pages and bytes indexed and their rate.
+    """
+
+    def __init__(self, interval=PROGRESS_INTERVAL):
+        self.interval = interval
+        self.start = time.time()
+        self.pages = 0
+        self.bytes = 0
+        self.next_report = interval
+
+    def update(self, pages, nbytes):
+        self.pages += pages
+        self.bytes += nbytes
+        if self.pages >= self.next_report:
+            self.report()
+            self.next_report = self.pages + self.interval
+
+    def report(self):
+        elapsed = max(time.time() - self.start, 1e-6)
+        logger.info("Indexed %d pages, %.1f MB in %.1fs (%.1f pages/sec, %.2f MB/sec)",
+                    self.pages, self.bytes / 1048576.0, elapsed,
+                    self.pages / elapsed, self.bytes / 1048576.0 / elapsed)
+
+def contentHash(page_content):
+    """
+        SHA1 of the page content, to find the pages which did not change
+        since they were last indexed.
+    """
+    if isinstance(page_content, unicode):
+        page_content = page_content.encode("utf-8")
+    return hashlib.sha1(page_content).hexdigest()
+
+def analyzePage(webpage_data, stop_word_list, extractor=None):
+    """
+        Parse a scrapped web page and sanitize the page text, the text of
+        its fields and the anchor text of its links.
+
+    :param webpage_data: dictionary of a scrapped web page
+    :param stop_word_list: set of stop words
+    :param extractor: extractor backend, see extractor.BACKENDS
+
+    :return:
+        title as string
+        List of words of the title and the text
+        dictionary of the PAGE_FIELDS with their list of words
+        List of (URL, list of words) of the anchors of the links
+    """
+    with stats.phase("parse"):
+        page = extractPage(webpage_data["page_content"], extractor)
+
+    # sanitize the text to get only useful words
+    with stats.phase("sanitize"):
+        title_words = sanitize(page.title, stop_word_list)
+        words = title_words + sanitize(page.text, stop_word_list)
+
+        fields = {
+            "title": title_words,
+            "heading": sanitize(u"\n".join(page.headings), stop_word_list),
+        }
+
+        anchors = []
+        for href, text in page.anchors:
+            url = canonicalize_url(href, webpage_data["page_url"])
+            anchor_words = sanitize(text, stop_word_list)
+            if url is not None and anchor_words:
+                anchors.append((url, anchor_words))
+
+    stats.count("pages_analyzed")
+    stats.count("tokens", len(words))
+    stats.count("anchors", len(anchors))
+
+    return page.title, words, fields, anchors
+
+def initWorker(stop_word_list, stem_cache_file, content_hashes, extractor, positions):
+    """
+        Set up a worker process of the indexing pool.
+    """
+    global worker_stop_word_list, worker_content_hashes, worker_extractor, worker_positions
+    worker_stop_word_list = stop_word_list
+    worker_content_hashes = content_hashes
+    worker_extractor = extractor
+    worker_positions = positions
+    if stem_cache_file is not None:
+        stem_cache.load(stem_cache_file)
+    # only the stems of the chunks are sent back to the parent
+    stem_cache.learned()
+
+def indexChunk(chunk):
+    """
+        Analyze a chunk of pages in a worker process and build the partial
+        vocabulary of every page.
+
+    A page with the same content as at the start of the run is not
+    analyzed, the parent process checks it again against the content hashes
+    of this run. Doc ids are assigned by the parent.
+
+    :param chunk: List of JSON lines of scrapped web pages
+
+    :return:
+        list of (line number, url, content hash or None for a tombstone,
+            outgoing links, title,
+            [(word, tf)] or None when not analyzed, {field: [(word, tf)]},
+            anchors, {word: [position]} or None, fingerprint) of the pages
+        (hits, misses) of the worker stem cache for this chunk
+        dictionary of the words and stems the worker cached for this chunk
+        PhaseStats summary of the worker for this chunk
+    """
+    hits, misses = stem_cache.hits, stem_cache.misses
+    stats.reset()
+
+    pages = []
+    for i, data in enumerate(chunk):
+        with stats.phase("json"):
+            webpage_data = json.loads(data)
+
+        url = pageUrl(webpage_data)
+        if webpage_data.get("deleted"):
+            pages.append((i, url) + (None,) * 8)
+            continue
+
+        content_hash = contentHash(webpage_data["page_content"])
+
+        title, term_counts, field_counts, anchors, term_positions, page_fingerprint = (None,) * 6
+        if worker_content_hashes.get(url) != content_hash:
+            title, words, fields, anchors = analyzePage(webpage_data, worker_stop_word_list, worker_extractor)
+
+            # words in the order they are first seen
+            term_counts = collections.OrderedDict()
+            for w in words:
+                term_counts[w] = term_counts.get(w, 0) + 1
+            term_counts = term_counts.items()
+
+            field_counts = dict((field, countTerms(field_words).items()) for field, field_words in fields.items())
+
+            if worker_positions:
+                term_positions = termPositions(words)
+
+            with stats.phase("fingerprint"):
+                page_fingerprint = fingerprint(words)
+
+        pages.append((i, url, content_hash, webpage_data['page_links'], title, term_counts, field_counts, anchors,
+                      term_positions, page_fingerprint))
+
+    stem_stats = (stem_cache.hits - hits, stem_cache.misses - misses)
+
+    return pages, stem_stats, stem_cache.learned(), stats.summary()
+
+def saveGeneration(generation_file):
+    """
+        Increase the index generation number stored in the file.
+
+        :return the new generation
+    """
+    generation = 0
+    try:
+        with open(generation_file, "r") as fd:
+            generation = int(fd.read().strip() or 0)
+    except (IOError, ValueError):
+        pass
+
+    generation += 1
+    with open(generation_file + ".tmp", "w") as fd:
+        fd.write("%d\n" % generation)
+    os.rename(generation_file + ".tmp", generation_file)
+
+    logger.info("Index generation: %d", generation)
+    return generation
+
+def indexUpToDate(registry_file, generation_file, index_files):
+    """
+        :return True when the index files exist and the last run which
+            saved the registry also finished writing them
+    """
+    for file_name in [generation_file] + index_files:
+        if not os.path.exists(file_name):
+            return False
+
+    # the generation is saved last, a failed run leaves it older than the
+    # registry saved before the index files
+    return not os.path.exists(registry_file) or \
+        os.path.getmtime(generation_file) >= os.path.getmtime(registry_file)
+
+def chunks(scrapped_data, chunk_size):
+    """
+        Split the scrapped data into lists of chunk_size lines.
+    """
+    chunk = []
+    for data in scrapped_data:
+        chunk.append(data)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+def process(scrapped_data_files, workers=1, extractor=None, positions=False, keep_stems=True):
     """
         Read all files in a path and generates a TF-IDF table.
 
-    :param path: String
+        The index is updated incrementally: a page whose content did not
+        change since it was last indexed is skipped, a changed page has its
+        old postings replaced. Only the changed index segments are saved.
+
+        The binary index, the anchor field and the PageRank are not
+        incremental: the IDFs, the doc vector lengths and the weight upper
+        bounds stored in index.bin change with every indexed page, so a run
+        which changes a page loads all the segments of the vocabularies and
+        writes index.bin and docs.bin again, in time proportional to the
+        corpus. A run which changes nothing leaves them as they are.
+
+        With positions the positions of the words in every page are kept
+        for the phrase queries. Once an index has positions they are kept
+        up to date by every run, delete position_segments to drop them.
+
+        A tombstone line of the crawler, {"page_url": url, "deleted": true},
+        removes the page from the index.
+
+        The duplicate pages, found by the fingerprints of their text, stay
+        in the segments but are left out of the binary index and their
+        links are merged into their canonical doc, see dedup.
+
+    :param scrapped_data_files: File name or list of file names, may be glob patterns
+    :param workers: Number of worker processes, 1 indexes in this process
+    :param extractor: HTML text extractor backend, see extractor.BACKENDS
+    :param positions: True to store the positions of the words
+    :param keep_stems: False to neither load nor save the stem cache file
 
     :return:
         index_data: The TF-IDF data
         link_data: All links and their child links
     """
-    index_file = "index_file.pkl"
+    index_dir = "index_segments"
+    index_file = "index.bin"
+    doc_file = "docs.bin"
+    forward_dir = "forward_segments"
+    position_dir = "position_segments"
+    registry_file = "doc_registry.pkl"
     link_file = "link_file.pkl"
-
-    index_data = {}
-    link_data = {}
-
-    # load the previous index
-    index_data = loadPickle(index_file)
-    if index_data == None:
-        print("Cannot load index file")
+    anchor_file = "anchor_file.pkl"
+    pagerank_file = "pagerank_file.pkl"
+    stem_cache_file = "stem_cache.pkl" if keep_stems else None
+    generation_file = "index.generation"
+
+    stats.reset()
+
+    # the previous index, its segments are loaded when needed
+    index_data = SegmentedDict(index_dir)
+    forward_data = SegmentedDict(forward_dir)
+    field_data = dict((field, SegmentedDict(field + "_segments")) for field in PAGE_FIELDS)
+
+    registry = DocRegistry()
+    registry.load(registry_file)
+
+    # the positions of the pages indexed without them are not known, only
+    # an index built with positions from the start can have them
+    if os.path.isdir(position_dir):
+        positions = True
+    elif positions and registry.numIndexed() > 0:
+        logger.error("The index has no positions, delete it and index all the pages again with --positions")
         exit(1)
 
+    # the pages indexed without a fingerprint have to be indexed again
+    reindex = False
+    if registry.missingFingerprints() > 0:
+        logger.warning("%d pages have no fingerprint, indexing every page of this run again",
+                       registry.missingFingerprints())
+        reindex = True
+    position_data = SegmentedDict(position_dir) if positions else None
+
     # load the previous index
     link_data = loadPickle(link_file)
     if link_data == None:
-        print("Cannot load index file")
+        logger.error("Cannot load index file")
+        exit(1)
+
+    anchor_data = loadPickle(anchor_file)
+    if anchor_data == None:
+        logger.error("Cannot load anchor file")
         exit(1)
 
-    # load scrapped data
+    if isinstance(scrapped_data_files, basestring):
+        scrapped_data_files = [scrapped_data_files]
+
+    # the scrapped data is streamed, one page at a time
     try:
-        scrapped_data = open(scrapped_data_file, "r").readlines()
-    except IOError:
-        print("Cannot find scrapped_data_file")
+        scrapped_data = readScrappedData(expandScrappedDataFiles(scrapped_data_files))
+    except IOError as e:
+        logger.error("Cannot find scrapped_data_file: %s", e)
         exit(2)
 
     # get stop-words
     stop_word_list = getStopWordList("stopwords.txt")
 
-    # update the index
-    for data in scrapped_data:
-        webpage_data = json.loads(data)
-
-        title = webpage_data["page_title"]
-        url = webpage_data["page_url"]
-        title, content = parseSGML(webpage_data["page_content"])
-        
-        doc_id = getHash(url)
-        #doc_id_title[doc_id] = title
+    # reuse the stems learned by the previous runs, the hits and misses are
+    # counted for this run
+    stem_cache.reset()
+    if stem_cache_file is not None:
+        stem_cache.load(stem_cache_file)
 
-        print("Processing: "+url)
-        #print(content)
-        #print(title)
+    progress = Progress()
+    unchanged = 0
+    deleted = 0
 
-        # sanitize the text to get only useful words
-        words = sanitize(title + "\n" + content, stop_word_list)
-
-        index_data = includeInVocabulary(index_data, doc_id, words)
+    # update the index
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initWorker,
+                                    (stop_word_list, stem_cache_file, {} if reindex else registry.contentHashes(),
+                                     extractor, positions))
+
+        # Pool.imap would read the whole input ahead, keep only a few chunks
+        # in flight instead and merge them in order, so the merged index is
+        # the same as the one built serially
+        pending = collections.deque()
+        chunk_iter = chunks(scrapped_data, CHUNK_SIZE)
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = next(chunk_iter, None)
+                if chunk is None:
+                    break
+                pending.append((pool.apply_async(indexChunk, (chunk,)), chunk))
+
+            if not pending:
+                break
+
+            result, chunk = pending.popleft()
+            with stats.phase("wait_workers"):
+                pages, stem_stats, new_stems, worker_stats = result.get()
+
+            for (i, url, content_hash, page_links, title, term_counts, field_counts, anchors, term_positions,
+                 page_fingerprint) in pages:
+                if content_hash is None:
+                    with stats.phase("index"):
+                        deleted += deletePage(url, registry, index_data, forward_data, field_data, position_data,
+                                              link_data, anchor_data)
+                    continue
+
+                if not reindex and registry.contentHash(registry.lookup(url)) == content_hash:
+                    unchanged += 1
+                    continue
+
+                logger.debug("Processing: %s", url)
+
+                doc_id = registry.getId(url)
+                if term_counts is None:
+                    # the page changed earlier in this run and is back to
+                    # the content the worker knew, index it here
+                    title, words, fields, anchors = analyzePage(json.loads(chunk[i]), stop_word_list, extractor)
+                    with stats.phase("index"):
+                        index_data = updateDocument(index_data, forward_data, doc_id, words, field_data, fields,
+                                                    position_data)
+                    length = len(words)
+                    field_lengths = dict((field, len(field_words)) for field, field_words in fields.items())
+                    with stats.phase("fingerprint"):
+                        page_fingerprint = fingerprint(words)
+                else:
+                    with stats.phase("index"):
+                        removeDocument(index_data, forward_data, doc_id, field_data, position_data)
+                        index_data = mergeVocabulary(index_data, [(w, [(doc_id, tf)]) for w, tf in term_counts])
+                        for field, counts in field_counts.items():
+                            mergeVocabulary(field_data[field], [(w, [(doc_id, tf)]) for w, tf in counts])
+                        if position_data is not None:
+                            includePositions(position_data, doc_id, term_positions)
+                        forward_data[doc_id] = {
+                            "terms": dict(term_counts),
+                            "fields": dict((field, dict(counts)) for field, counts in field_counts.items()),
+                        }
+                    length = sum(tf for _, tf in term_counts)
+                    field_lengths = dict((field, sum(tf for _, tf in counts)) for field, counts in field_counts.items())
+
+                registry.setDocument(doc_id, title, length, content_hash, field_lengths, page_fingerprint)
+                with stats.phase("links"):
+                    link_data = updateLinksData(doc_id, page_links, link_data, registry)
+                    anchor_data = updateAnchorData(doc_id, anchors, anchor_data, registry)
+
+            stem_cache.hits += stem_stats[0]
+            stem_cache.misses += stem_stats[1]
+            stem_cache.update(new_stems)
+            stats.merge(worker_stats)
+
+            progress.update(len(chunk), sum(len(data) for data in chunk))
+
+        pool.close()
+        pool.join()
+    else:
+        for data in scrapped_data:
+            progress.update(1, len(data))
+
+            with stats.phase("json"):
+                webpage_data = json.loads(data)
+
+            url = pageUrl(webpage_data)
+
+            # a page gone from the site
+            if webpage_data.get("deleted"):
+                with stats.phase("index"):
+                    deleted += deletePage(url, registry, index_data, forward_data, field_data, position_data,
+                                          link_data, anchor_data)
+                continue
+
+            # skip the page if it did not change since it was indexed
+            content_hash = contentHash(webpage_data["page_content"])
+            if not reindex and registry.contentHash(registry.lookup(url)) == content_hash:
+                unchanged += 1
+                continue
+
+            logger.debug("Processing: %s", url)
+
+            doc_id = registry.getId(url)
+            title, words, fields, anchors = analyzePage(webpage_data, stop_word_list, extractor)
+            with stats.phase("index"):
+                index_data = updateDocument(index_data, forward_data, doc_id, words, field_data, fields,
+                                            position_data)
+            with stats.phase("fingerprint"):
+                page_fingerprint = fingerprint(words)
+            registry.setDocument(doc_id, title, len(words), content_hash,
+                                 dict((field, len(field_words)) for field, field_words in fields.items()),
+                                 page_fingerprint)
+
+            with stats.phase("links"):
+                link_data = updateLinksData(doc_id, webpage_data['page_links'], link_data, registry)
+                anchor_data = updateAnchorData(doc_id, anchors, anchor_data, registry)
+
+    progress.report()
+    logger.info("Skipped %d unchanged pages, deleted %d pages", unchanged, deleted)
+
+    logger.info("Stem cache: %(hits)d hits, %(misses)d misses, hit rate %(hit_rate).3f, %(size)d words",
+                stem_cache.stats())
+
+    stats.count("pages", progress.pages)
+    stats.count("bytes", progress.bytes)
+    stats.count("unchanged_pages", unchanged)
+    stats.count("deleted_pages", deleted)
+
+    # the binary index of the last run is still valid, writing it again
+    # would load every segment
+    if progress.pages == unchanged and not reindex and \
+            indexUpToDate(registry_file, generation_file, [index_file, doc_file, link_file, pagerank_file]):
+        logger.info("No page changed, the index is up to date")
+        return index_data, link_data
+
+    with stats.phase("save_segments"):
+        if stem_cache_file is not None:
+            stem_cache.save(stem_cache_file)
+
+        # Once the index has been created, save it for later reuse
+        index_data.save()
+        forward_data.save()
+        for vocabulary in field_data.values():
+            vocabulary.save()
+        if position_data is not None:
+            position_data.save()
+
+        registry.save(registry_file)
+
+    # a page changed in this run may join or leave a cluster, the clusters
+    # are found again from the fingerprints of all the pages
+    with stats.phase("duplicates"):
+        duplicates = findDuplicates(registry.fingerprints)
+    logger.info("Found %d duplicate pages of %d docs", len(duplicates), len(set(duplicates.values())))
+
+    # the anchor text of the links depends on the pages linking to a doc,
+    # it is gathered from every page for every run
+    with stats.phase("anchors"):
+        anchor_vocabulary, anchor_lengths = buildAnchorVocabulary(anchor_data, registry, duplicates)
+
+    # the compact copy of the index opened by the search
+    with stats.phase("write_index"):
+        fields = dict(field_data, anchor=anchor_vocabulary)
+        field_lengths = fieldLengths(registry.lengths, dict(registry.field_lengths, anchor=anchor_lengths))
+        norms = writeIndex(index_data, registry.numIndexed() - len(duplicates), registry.lengths, index_file, fields,
+                           field_lengths, position_data, duplicates)
+        writeDocTable(registry, norms, doc_file, field_lengths, duplicates)
+
+    with stats.phase("save_links"):
+        if savePickle(link_file, link_data) > 0:
+            logger.error("Cannot save link file")
+            exit(3)
+
+        if savePickle(anchor_file, anchor_data) > 0:
+            logger.error("Cannot save anchor file")
+            exit(3)
+
+        # the link file keeps the links of every page for the next run,
+        # the PageRank is of the canonical docs
+        canonical_link_data = canonicalLinks(link_data, duplicates)
+
+    # the link analysis does not depend on the query, do it once here
+    with stats.phase("pagerank"):
+        pagerank_data = computePageRank(canonical_link_data, len(registry))
+        if savePickle(pagerank_file, pagerank_data) > 0:
+            logger.error("Cannot save PageRank file")
+            exit(3)
+
+    # written last, tells the search server a complete new index is ready
+    saveGeneration(generation_file)
+
+    stats.count("docs", len(registry))
+    stats.count("duplicates", len(duplicates))
+    stats.count("unique_terms", len(index_data))
 
-        link_data = updateLinksData(url, webpage_data['page_links'], link_data)
+    return index_data, link_data
 
-        #break
+def runSummary(elapsed):
+    """
+        The machine readable summary of the last process() run. With
+        worker processes the json, parse and sanitize times are summed over
+        the workers.
 
-    # Once the index has been created, save it for later reuse
-    if savePickle(index_file, index_data) > 0:
-        print("Cannot save index file")
-        exit(3)
+        :return dictionary of the phases, counters and stem cache stats
+    """
+    summary = stats.summary()
+    summary["seconds"] = elapsed
+    summary["stem_cache"] = stem_cache.stats()
 
-    if savePickle(link_file, link_data) > 0:
-        print("Cannot save link file")
-        exit(3)
+    return summary
 
-    return index_data, link_data
+def logSummary(summary):
+    for name, phase in sorted(summary["phases"].items(), key=lambda e: -e[1]["seconds"]):
+        logger.info("%-14s %9.3fs %9d calls", name, phase["seconds"], phase["calls"])
+    for name, n in sorted(summary["counters"].items()):
+        logger.info("%-14s %12d", name, n)
 
 
 if __name__ == "__main__":
     project_dir = "/home/c/chandanchowdhury/Documents/CIS-833/CSSearch/"
 
-    
     #scrapped_data_file = "crawler/crawler/spiders/ksucs_2017-12-09_16.json"
     scrapped_data_file = "crawler/crawler/spiders/ksucs_2017-12-09_20.json"
     #scrapped_data_file = "crawler/crawler/spiders/sample.json"
 
-    index_data, link_data = process(project_dir+scrapped_data_file)
-    #print("N =%d" % N)
-    #print("Index")
-    #print(index_data)
-    #print("link data")
-    #for l in link_data:
-    #    print("SRC: %s" % l)
-    #    for lc in link_data.get(l):
-    #        print("-> %s" % lc)
-
-
+    parser = argparse.ArgumentParser(description="Index the scrapped web pages")
+    parser.add_argument("scrapped_data_files", nargs="*", default=[project_dir+scrapped_data_file],
+                        help="JSON lines files written by the crawler, may be glob patterns "
+                             "and gzip (.gz) or zstd (.zst) compressed")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes used for indexing")
+    parser.add_argument("--extractor", default=DEFAULT_BACKEND, choices=BACKENDS,
+                        help="HTML text extractor, bs4 is the slowest")
+    parser.add_argument("--positions", action="store_true",
+                        help="store the positions of the words for phrase and proximity queries")
+    parser.add_argument("--no-stem-cache", dest="keep_stems", action="store_false",
+                        help="neither load nor save the stem cache file of the earlier runs")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="DEBUG also logs every page and link")
+    parser.add_argument("--stats-file", help="write the phase timers and counters of the run as JSON")
+    parser.add_argument("--profile", help="run under cProfile and save the profile to this file")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="report the lines which allocated the most memory (Python 3)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level), format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.tracemalloc:
+        if tracemalloc is None:
+            logger.warning("tracemalloc is not available in this Python")
+            args.tracemalloc = False
+        else:
+            tracemalloc.start()
+
+    profiler = cProfile.Profile() if args.profile else None
+
+    start = time.time()
+    if profiler is not None:
+        profiler.enable()
+    index_data, link_data = process(args.scrapped_data_files, args.workers, args.extractor, args.positions,
+                                    args.keep_stems)
+    if profiler is not None:
+        profiler.disable()
+    summary = runSummary(time.time() - start)
+
+    logSummary(summary)
+
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        logger.info("Saved profile to: %s", args.profile)
+        pstats.Stats(args.profile).sort_stats("cumulative").print_stats(20)
+
+    if args.tracemalloc:
+        snapshot = tracemalloc.take_snapshot()
+        summary["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+        for stat in snapshot.statistics("lineno")[:10]:
+            logger.info("%s", stat)
+
+    if args.stats_file:
+        with open(args.stats_file, "w") as fd:
+            json.dump(summary, fd, indent=2, sort_keys=True)
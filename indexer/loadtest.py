@@ -0,0 +1,113 @@
+"""
+    Load test of the search server, reports the QPS and latency percentiles.
+
+    Usage:
+        python server.py --quiet &
+        python loadtest.py --url http://127.0.0.1:8080 --concurrency 8 --requests 2000
+"""
+try:
+    from urllib2 import HTTPError, urlopen
+    from urllib import urlencode
+except ImportError:
+    from urllib.error import HTTPError
+    from urllib.parse import urlencode
+    from urllib.request import urlopen
+
+import argparse
+import json
+import threading
+import time
+
+from metrics import percentile
+
+# the department queries of search.py
+QUERIES = [
+    "computer science",
+    "caragea",
+    "cornelia caragea",
+    "computer science information retrieval",
+    "computer science caragea",
+    "computer science facebook",
+    "beocat",
+    "beocat help",
+    "beocat administration team",
+    "chandan chowdhury",
+    "krutarth",
+    "ranojoy chatterjee",
+    "joydeep mitra",
+    "George Amariucai",
+]
+
+
+def run(url, queries, concurrency, num_requests, topN):
+    """
+        Send num_requests searches from concurrency threads, each thread
+        waits for its response before sending the next request.
+
+        :return list of latencies in seconds, number of failed requests,
+            elapsed seconds
+    """
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    counter = [0]
+
+    def worker():
+        while True:
+            with lock:
+                n = counter[0]
+                if n >= num_requests:
+                    return
+                counter[0] += 1
+
+            query = urlencode({"q": queries[n % len(queries)], "n": topN})
+            start = time.time()
+            try:
+                fd = urlopen(url + "/search?" + query)
+                fd.read()
+                fd.close()
+            except (HTTPError, IOError):
+                with lock:
+                    errors[0] += 1
+                continue
+            elapsed = time.time() - start
+
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return latencies, errors[0], time.time() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the CSSearch search server")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--queries", help="file with one query per line, the department queries by default")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of client threads")
+    parser.add_argument("--requests", type=int, default=1000, help="total number of requests")
+    parser.add_argument("-n", type=int, default=10, help="results per query")
+    args = parser.parse_args()
+
+    queries = QUERIES
+    if args.queries:
+        with open(args.queries, "r") as fd:
+            queries = [l.strip() for l in fd if l.strip()]
+
+    latencies, errors, elapsed = run(args.url.rstrip("/"), queries, args.concurrency, args.requests, args.n)
+
+    print("requests: %d \t errors: %d \t time: %.2fs \t QPS: %.1f" %
+          (len(latencies), errors, elapsed, len(latencies) / elapsed))
+    print("latency p50: %.2fms \t p99: %.2fms \t max: %.2fms" %
+          (1000 * percentile(latencies, 50), 1000 * percentile(latencies, 99),
+           1000 * max(latencies) if latencies else 0.0))
+
+    fd = urlopen(args.url.rstrip("/") + "/stats")
+    print("server: %s" % json.dumps(json.loads(fd.read().decode("utf-8"))["latency"]))
+    fd.close()
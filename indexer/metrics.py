@@ -0,0 +1,109 @@
+"""
+    Timer, latency and counter bookkeeping shared by the indexer, the search
+    server, the benchmarks and the load test.
+"""
+import collections
+import contextlib
+import threading
+import time
+
+# number of recent latencies a LatencyRecorder keeps for its percentiles
+LATENCY_WINDOW = 10000
+
+
+def percentile(values, p):
+    """
+        The p-th percentile of the values, nearest rank.
+    """
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+
+class LatencyRecorder(object):
+    """
+        Thread safe record of request latencies. The count and total cover
+        every request, the percentiles the last window requests.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.count += 1
+            self.total += seconds
+
+    def summary(self):
+        """
+            :return dictionary of count, mean_ms, p50_ms, p99_ms and max_ms
+        """
+        with self.lock:
+            latencies = list(self.latencies)
+            count = self.count
+            total = self.total
+
+        return {
+            "count": count,
+            "mean_ms": 1000 * total / count if count else 0.0,
+            "p50_ms": 1000 * percentile(latencies, 50),
+            "p99_ms": 1000 * percentile(latencies, 99),
+            "max_ms": 1000 * max(latencies) if latencies else 0.0,
+        }
+
+
+class PhaseStats(object):
+    """
+        Cumulative time spent in each phase of a run, and counters.
+
+            with stats.phase("parse"):
+                ...
+            stats.count("pages")
+
+        The stats of worker processes are added with merge().
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.times = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        self.counters = collections.defaultdict(int)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.times[name] += time.time() - start
+            self.calls[name] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def merge(self, summary):
+        """
+            Add the summary() of another PhaseStats.
+        """
+        for name, phase in summary["phases"].items():
+            self.times[name] += phase["seconds"]
+            self.calls[name] += phase["calls"]
+        for name, n in summary["counters"].items():
+            self.counters[name] += n
+
+    def summary(self):
+        """
+            :return dictionary of phases, with the seconds and calls of each,
+                and counters
+        """
+        return {
+            "phases": dict((name, {"seconds": self.times[name], "calls": self.calls[name]}) for name in self.times),
+            "counters": dict(self.counters),
+        }
@@ -0,0 +1,175 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from array import array
+
+# teleport probability
+EPSILON = 0.8
+
+DEFAULT_TOLERANCE = 1.0e-6
+DEFAULT_MAX_ITERATIONS = 100
+
+
+class LinkGraph(object):
+    """
+        A directed graph stored as adjacency arrays (CSR).
+
+        The nodes are numbered 0..N-1, nodes[i] is the original key (URL) of
+        node i and the out-links of node i are
+        targets[offsets[i]:offsets[i+1]].
+    """
+
+    def __init__(self, nodes, offsets, targets):
+        self.nodes = nodes
+        self.offsets = offsets
+        self.targets = targets
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def out_degree(self, i):
+        return self.offsets[i + 1] - self.offsets[i]
+
+    def node_ids(self):
+        """
+            Return a dictionary of node key to integer node id.
+        """
+        return dict((n, i) for i, n in enumerate(self.nodes))
+
+
+def build_link_graph(link_data, nodes=None):
+    """
+        Convert link_data into a LinkGraph, done once per link_data.
+
+        :param link_data as dictionary of source link with destination links
+        :param nodes optional list of links, when given only these nodes and
+            the edges between them are kept in the graph. By default every
+            source and destination link becomes a node.
+
+        :return LinkGraph
+    """
+    if nodes is None:
+        nodes = list(link_data)
+        node_id = dict((n, i) for i, n in enumerate(nodes))
+
+        # destinations which were never crawled are dangling nodes
+        for src in link_data:
+            for dest in link_data.get(src):
+                if dest not in node_id:
+                    node_id[dest] = len(nodes)
+                    nodes.append(dest)
+    else:
+        unique_nodes = []
+        node_id = {}
+        for n in nodes:
+            if n not in node_id:
+                node_id[n] = len(unique_nodes)
+                unique_nodes.append(n)
+        nodes = unique_nodes
+
+    offsets = array('i', [0])
+    targets = array('i')
+    for n in nodes:
+        seen = set()
+        for dest in link_data.get(n) or ():
+            j = node_id.get(dest)
+            # edge leaves the graph or is a duplicate
+            if j is None or j in seen:
+                continue
+            seen.add(j)
+            targets.append(j)
+        offsets.append(len(targets))
+
+    return LinkGraph(nodes, offsets, targets)
+
+
+def pagerank(graph, epsilon, tolerance=DEFAULT_TOLERANCE,
+             max_iterations=DEFAULT_MAX_ITERATIONS):
+    """
+        PageRank with teleport using power iteration.
+
+        A node with no out-links (dangling node) spreads its score evenly
+        over all the nodes. The iteration stops once the L1 distance between
+        two consecutive score vectors drops below the tolerance.
+
+        :param graph as LinkGraph
+        :param epsilon the teleport probability
+        :param tolerance L1 convergence threshold
+        :param max_iterations upper bound on the number of iterations
+
+        :return array of scores indexed by node id, the scores sum to 1
+    """
+    if len(graph) == 0:
+        return array('d')
+
+    if numpy is not None:
+        return _pagerank_numpy(graph, epsilon, tolerance, max_iterations)
+
+    return _pagerank_python(graph, epsilon, tolerance, max_iterations)
+
+
+def _pagerank_numpy(graph, epsilon, tolerance, max_iterations):
+    n = len(graph)
+
+    offsets = numpy.array(graph.offsets, dtype=numpy.int64)
+    targets = numpy.array(graph.targets, dtype=numpy.int64)
+
+    degree = numpy.diff(offsets)
+    dangling = degree == 0
+    inv_degree = numpy.zeros(n)
+    inv_degree[~dangling] = 1.0 / degree[~dangling]
+    # source node of every edge, lines up with targets
+    sources = numpy.repeat(numpy.arange(n), degree)
+
+    score = numpy.empty(n)
+    score.fill(1.0 / n)
+    for _ in range(max_iterations):
+        share = (score * inv_degree)[sources]
+        new_score = numpy.bincount(targets, weights=share, minlength=n)
+        new_score += score[dangling].sum() / n
+        new_score *= (1 - epsilon)
+        new_score += epsilon / n
+
+        delta = numpy.abs(new_score - score).sum()
+        score = new_score
+        if delta < tolerance:
+            break
+
+    return array('d', score.tolist())
+
+
+def _pagerank_python(graph, epsilon, tolerance, max_iterations):
+    n = len(graph)
+    offsets = graph.offsets
+    targets = graph.targets
+    node_range = range(n)
+
+    score = array('d', [1.0 / n]) * n
+    for _ in range(max_iterations):
+        new_score = array('d', [0.0]) * n
+        dangling = 0.0
+        for i in node_range:
+            start = offsets[i]
+            end = offsets[i + 1]
+            if start == end:
+                dangling += score[i]
+                continue
+
+            share = score[i] / (end - start)
+            for j in targets[start:end]:
+                new_score[j] += share
+
+        base = epsilon / n + (1 - epsilon) * dangling / n
+        delta = 0.0
+        for i in node_range:
+            s = base + (1 - epsilon) * new_score[i]
+            delta += abs(s - score[i])
+            new_score[i] = s
+
+        score = new_score
+        if delta < tolerance:
+            break
+
+    return score
@@ -0,0 +1,271 @@
+"""
+    Set operations on postings for the conjunctive (AND) and disjunctive
+    (OR) matching of the search.
+
+    A postings list is a list of doc ids in increasing order. The frequent
+    terms also have a bitmap in the index (see diskindex.BITMAP_DENSITY),
+    a bitmap is turned into a Python integer so that the AND / OR of two
+    bitmaps is a single operation.
+
+    The phrase and proximity matching only decodes the positions of the
+    docs left by the conjunctive matching.
+"""
+import binascii
+import bisect
+import heapq
+import re
+
+# lists less than GALLOP_RATIO times longer than the other list are
+# intersected with a set, galloping pays off only for a much longer list
+GALLOP_RATIO = 16
+
+# the non zero bytes of a bitmap
+NONZERO_RE = re.compile(b"[^\x00]")
+
+
+def gallop(doc_ids, target, lo=0):
+    """
+        First position from lo on whose doc id is not less than target.
+
+        The positions lo, lo+1, lo+3, lo+7, ... are probed until one is past
+        the target and only the last gap is binary searched, so walking a
+        long list with increasing targets skips most of it.
+    """
+    n = len(doc_ids)
+    hi = lo
+    step = 1
+    while hi < n and doc_ids[hi] < target:
+        lo = hi + 1
+        hi += step
+        step *= 2
+
+    return bisect.bisect_left(doc_ids, target, lo, min(hi, n))
+
+
+def intersect(small, large):
+    """
+        :param small sorted doc ids, the shorter list
+        :param large sorted doc ids
+
+        :return sorted doc ids in both lists
+    """
+    if len(large) < GALLOP_RATIO * len(small):
+        large = set(large)
+        return [doc_id for doc_id in small if doc_id in large]
+
+    result = []
+    pos = 0
+    n = len(large)
+    for doc_id in small:
+        pos = gallop(large, doc_id, pos)
+        if pos == n:
+            break
+        if large[pos] == doc_id:
+            result.append(doc_id)
+            pos += 1
+
+    return result
+
+
+def union(lists):
+    """
+        :return sorted doc ids in any of the lists
+    """
+    docs = set()
+    for doc_ids in lists:
+        docs.update(doc_ids)
+
+    return sorted(docs)
+
+
+def bitmapToInt(bitmap):
+    """
+        The bitmap as an integer, bit d of the integer is bit d of the bitmap.
+    """
+    if not bitmap:
+        return 0
+    return int(binascii.hexlify(bitmap[::-1]), 16)
+
+
+def intToDocIds(value, size):
+    """
+        :param value integer of a bitmap
+        :param size number of bytes of the bitmap
+
+        :return sorted doc ids of the bits set in value
+    """
+    if not value:
+        return []
+
+    bitmap = bytearray(binascii.unhexlify("%0*x" % (2 * size, value))[::-1])
+
+    doc_ids = []
+    for match in NONZERO_RE.finditer(bytes(bitmap)):
+        i = match.start()
+        byte = bitmap[i]
+        for bit in range(8):
+            if byte & (1 << bit):
+                doc_ids.append(8 * i + bit)
+
+    return doc_ids
+
+
+def filterBitmap(doc_ids, bitmap):
+    """
+        :return the doc ids whose bit is set in the bitmap
+    """
+    bitmap = bytearray(bitmap)
+    return [d for d in doc_ids if bitmap[d >> 3] & (1 << (d & 7))]
+
+
+def conjunction(index_data, terms):
+    """
+        Doc ids of the docs which contain all the terms.
+
+        The terms are taken from the rarest to the most frequent, so the
+        result only shrinks: the rarest term's doc ids are filtered by the
+        bitmap of every frequent term and galloped through the postings of
+        the others. When every term has a bitmap the bitmaps are ANDed.
+
+        :param index_data MappedIndex
+        :param terms list of strings
+
+        :return sorted doc ids, empty when a term is not in the index
+    """
+    terms = sorted(set(terms), key=index_data.df)
+    if not terms or index_data.df(terms[0]) == 0:
+        return []
+
+    bitmaps = [index_data.bitmap(term) for term in terms]
+    if bitmaps[0] is not None:
+        value = bitmapToInt(bitmaps[0])
+        for bitmap in bitmaps[1:]:
+            value &= bitmapToInt(bitmap)
+        return intToDocIds(value, len(bitmaps[0]))
+
+    result = index_data.docIds(terms[0])
+    for term, bitmap in zip(terms[1:], bitmaps[1:]):
+        if not result:
+            break
+
+        if bitmap is not None:
+            result = filterBitmap(result, bitmap)
+        else:
+            result = intersect(result, index_data.docIds(term))
+
+    return result
+
+
+def disjunction(index_data, terms):
+    """
+        Doc ids of the docs which contain any of the terms, the terms not in
+        the index are ignored.
+
+        :param index_data MappedIndex
+        :param terms list of strings
+
+        :return sorted doc ids
+    """
+    terms = set(terms)
+
+    value = 0
+    size = 0
+    lists = []
+    for term in terms:
+        bitmap = index_data.bitmap(term)
+        if bitmap is not None:
+            value |= bitmapToInt(bitmap)
+            size = len(bitmap)
+        else:
+            lists.append(index_data.docIds(term))
+
+    if not value:
+        return union(lists)
+
+    return union([intToDocIds(value, size)] + lists)
+
+
+def windowMatch(position_lists, window):
+    """
+        :param position_lists sorted positions in a doc of every term
+        :param window largest distance between the first and the last term
+
+        :return True when all the terms are within window words, in any order
+    """
+    heap = [(positions[0], i, 0) for i, positions in enumerate(position_lists)]
+    heapq.heapify(heap)
+    last = max(position for position, _, _ in heap)
+
+    while True:
+        first, i, j = heap[0]
+        if last - first <= window:
+            return True
+
+        j += 1
+        if j == len(position_lists[i]):
+            return False
+
+        position = position_lists[i][j]
+        last = max(last, position)
+        heapq.heapreplace(heap, (position, i, j))
+
+
+def phraseFilter(index_data, doc_ids, terms):
+    """
+        The docs which contain the terms as a phrase.
+
+        The terms are taken from the rarest to the most frequent, the
+        possible start positions of the phrase in a doc only shrink and the
+        positions of a term are only decoded for the docs left.
+    """
+    starts = None
+    for offset in sorted(range(len(terms)), key=lambda i: index_data.df(terms[i])):
+        positions = index_data.positions(terms[offset], doc_ids)
+
+        if starts is None:
+            starts = dict((doc_id, set(p - offset for p in doc_positions))
+                          for doc_id, doc_positions in positions.items())
+        else:
+            for doc_id in doc_ids:
+                doc_starts = starts[doc_id]
+                doc_starts.intersection_update(p - offset for p in positions.get(doc_id, ()))
+                if not doc_starts:
+                    del starts[doc_id]
+
+        doc_ids = sorted(starts)
+        if not doc_ids:
+            break
+
+    return doc_ids
+
+
+def positionFilter(index_data, doc_ids, terms, window=None):
+    """
+        The docs which contain the terms as a phrase, or within a window of
+        words. Only the positions of the given docs are decoded.
+
+        :param index_data MappedIndex with positions
+        :param doc_ids sorted doc ids which contain all the terms
+        :param terms list of strings, in the order of the phrase
+        :param window None for an exact phrase, else the largest distance
+            between the first and the last term
+
+        :return sorted doc ids
+    """
+    if not doc_ids:
+        return []
+
+    if window is None:
+        return phraseFilter(index_data, doc_ids, terms)
+
+    # a term repeated in a proximity query matches once
+    terms = sorted(set(terms))
+    positions = [index_data.positions(term, doc_ids) for term in terms]
+
+    result = []
+    for doc_id in doc_ids:
+        position_lists = [term_positions.get(doc_id) for term_positions in positions]
+        if None not in position_lists and windowMatch(position_lists, window):
+            result.append(doc_id)
+
+    return result
@@ -0,0 +1,103 @@
+"""
+    Cache of query results for the search.
+"""
+import collections
+import threading
+import time
+
+# number of results the cache keeps
+CACHE_SIZE = 1024
+
+# seconds a result is kept, None keeps it until it is evicted
+CACHE_TTL = 300.0
+
+
+class QueryCache(object):
+    """
+        Thread safe LRU cache of query results with a time to live.
+
+        A result is stored with the generation of the index it was computed
+        on. Asking with another generation empties the cache, so a new index
+        never serves results of the old one.
+
+        The cached values are shared by every caller and must not be changed.
+    """
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.generation = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _checkGeneration(self, generation):
+        if generation != self.generation:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.generation = generation
+
+    def get(self, key, generation):
+        """
+            :return the cached value or None
+        """
+        with self.lock:
+            self._checkGeneration(generation)
+
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            # move to the most recently used end
+            self.entries[key] = entry
+            self.hits += 1
+            return value
+
+    def put(self, key, generation, value):
+        if self.max_size <= 0:
+            return
+
+        with self.lock:
+            self._checkGeneration(generation)
+
+            expires = time.time() + self.ttl if self.ttl is not None else None
+            self.entries.pop(key, None)
+            self.entries[key] = (value, expires)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """
+            :return dictionary of hits, misses, hit_rate, evictions,
+                expirations, invalidations and size
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / float(lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "size": len(self.entries),
+            }
@@ -0,0 +1,135 @@
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
+import logging
+from array import array
+
+logger = logging.getLogger(__name__)
+
+
+class DocRegistry(object):
+    """
+        Assign dense integer doc ids to URLs, the postings and the link data
+        use the doc id instead of the URL.
+
+        The URL, title, length (number of words), field lengths, content
+        hash and text fingerprint (see dedup) of a document are kept once
+        here. A linked URL which was never
+        crawled also gets a doc id, with an empty title and length 0.
+    """
+
+    def __init__(self):
+        self.urls = []
+        self.titles = []
+        self.lengths = array('I')
+        self.hashes = []
+        self.fingerprints = []
+        self.ids = {}
+
+        # dictionary of field name with the array of its lengths
+        self.field_lengths = {}
+
+    def __len__(self):
+        return len(self.urls)
+
+    def numIndexed(self):
+        """
+            Number of crawled and indexed docs.
+        """
+        return sum(1 for h in self.hashes if h is not None)
+
+    def getId(self, url):
+        """
+            Doc id of the URL, a new id is assigned to an unknown URL.
+        """
+        doc_id = self.ids.get(url)
+        if doc_id is None:
+            doc_id = len(self.urls)
+            self.ids[url] = doc_id
+            self.urls.append(url)
+            self.titles.append(u"")
+            self.lengths.append(0)
+            self.hashes.append(None)
+            self.fingerprints.append(None)
+            for lengths in self.field_lengths.values():
+                lengths.append(0)
+
+        return doc_id
+
+    def lookup(self, url):
+        """
+            Doc id of the URL or None.
+        """
+        return self.ids.get(url)
+
+    def setDocument(self, doc_id, title, length, content_hash, field_lengths=None, fingerprint=None):
+        """
+            :param field_lengths dictionary of field name and its length
+            :param fingerprint fingerprint of the text, see dedup.fingerprint
+        """
+        self.titles[doc_id] = title
+        self.lengths[doc_id] = length
+        self.hashes[doc_id] = content_hash
+        self.fingerprints[doc_id] = fingerprint
+
+        for field, n in (field_lengths or {}).items():
+            if field not in self.field_lengths:
+                self.field_lengths[field] = array('I', [0]) * len(self.urls)
+            self.field_lengths[field][doc_id] = n
+
+    def removeDocument(self, doc_id):
+        """
+            Forget the page of a doc id, its URL stays linked to.
+        """
+        self.setDocument(doc_id, u"", 0, None, dict((field, 0) for field in self.field_lengths))
+
+    def contentHash(self, doc_id):
+        if doc_id is None:
+            return None
+        return self.hashes[doc_id]
+
+    def contentHashes(self):
+        """
+            :return dictionary of URL and content hash of the indexed pages
+        """
+        return dict((url, h) for url, h in zip(self.urls, self.hashes) if h is not None)
+
+    def missingFingerprints(self):
+        """
+            Number of indexed docs without a fingerprint, indexed before
+            the duplicate detection.
+        """
+        return sum(1 for h, f in zip(self.hashes, self.fingerprints) if h is not None and f is None)
+
+    def load(self, registry_file):
+        logger.info("Loading doc registry from file: %s", registry_file)
+
+        try:
+            with open(registry_file, "rb") as fd:
+                data = pickle.load(fd)
+        except (IOError, EOFError):
+            return
+
+        self.urls = data["urls"]
+        self.titles = data["titles"]
+        self.lengths = data["lengths"]
+        self.hashes = data["hashes"]
+        self.field_lengths = data.get("field_lengths", {})
+        self.fingerprints = data.get("fingerprints") or [None] * len(self.urls)
+        self.ids = dict((url, i) for i, url in enumerate(self.urls))
+
+    def save(self, registry_file):
+        logger.info("Saving doc registry to file: %s", registry_file)
+
+        data = {
+            "urls": self.urls,
+            "titles": self.titles,
+            "lengths": self.lengths,
+            "hashes": self.hashes,
+            "field_lengths": self.field_lengths,
+            "fingerprints": self.fingerprints,
+        }
+        with open(registry_file, "wb") as fd:
+            pickle.dump(data, fd, pickle.HIGHEST_PROTOCOL)
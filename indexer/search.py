@@ -4,14 +4,37 @@ except:
     import pickle
 
 import collections
+import heapq
+import math
 import operator
-import string
-from sets import Set
+import os
+import re
+from array import array
 
-from stemming.porter import stem
+from analyzer import getStopWordList, sanitize
+from pagerank import EPSILON, build_link_graph, pagerank
+from diskindex import FIELDS, MappedIndex
+from postings import conjunction, disjunction, gallop, intersect, positionFilter
 
-ROUND_DIGITS = 6
-EPSILON = 0.8
+PROJECT_DIR = "/home/c/chandanchowdhury/Documents/CIS-833/CSSearch/indexer/"
+
+# written by the indexer after a complete index
+GENERATION_FILE = "index.generation"
+
+# ranking models of rank_links
+RANKING_MODELS = ("tfidf", "bm25", "bm25f")
+DEFAULT_MODEL = "tfidf"
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# a quoted phrase of the query, "a b"~k matches a and b within k words in
+# any order
+PHRASE_RE = re.compile(r'"([^"]*)"(?:~(\d+))?')
+
+# boost of the tf of every field of diskindex.FIELDS in the bm25f model
+FIELD_BOOSTS = {"title": 3.0, "heading": 2.0, "body": 1.0, "anchor": 2.0}
 
 def loadPickle(pickle_file):
     """
@@ -32,281 +55,435 @@ def loadPickle(pickle_file):
 
     return data
 
-def loadData():
+def loadData(project_dir=PROJECT_DIR):
     """
-        Load the pickle data.
+        Load the index and the PageRank, everything a query needs. The link
+        files are only used by the indexer.
 
-    """
-    project_dir = "/home/c/chandanchowdhury/Documents/CIS-833/CSSearch/indexer/"
+        :param project_dir the directory the indexer wrote the index to
 
-    index_file = "index_file.pkl"
-    link_file = "link_file.pkl"
+        :return index_data as MappedIndex, pagerank_data
+    """
+    index_file = "index.bin"
+    doc_file = "docs.bin"
+    pagerank_file = "pagerank_file.pkl"
 
-    index_data = loadPickle(project_dir+index_file)
-    link_data = loadPickle(project_dir+link_file)
+    # read before the files, a generation written during the load is
+    # newer than the files loaded
+    generation = loadGeneration(project_dir)
 
-    return index_data, link_data
+    index_data = MappedIndex(os.path.join(project_dir, index_file), os.path.join(project_dir, doc_file))
+    index_data.generation = generation
+    pagerank_data = loadPageRank(os.path.join(project_dir, pagerank_file))
 
-def getStopWordList(stop_word_list_file_path=None):
-    
-    stop_word_list = None
+    return index_data, pagerank_data
 
-    if stop_word_list_file_path == None:
-        stop_word_list = set(stopwords.words('english'))
-    else:
-        fd = open(stop_word_list_file_path, "r")
-        txt = fd.readlines()
-        fd.close()
+def loadGeneration(project_dir=PROJECT_DIR):
+    """
+        The generation number of the index, increased by every indexer run.
 
-        stop_word_list = []
-        for l in txt:
-            stop_word_list.append(l.lstrip().rstrip())
+        :return generation, 0 if the index has none
+    """
+    try:
+        with open(os.path.join(project_dir, GENERATION_FILE), "r") as fd:
+            return int(fd.read().strip() or 0)
+    except (IOError, ValueError):
+        return 0
 
-    return stop_word_list
+def loadPageRank(pagerank_file):
+    """
+        Load the static PageRank scores saved by the indexer.
 
-def stemm_word(word):
+        :return array of PageRank scores indexed by doc id
     """
-        Use Porter stemmer to stem words.
+    data = loadPickle(pagerank_file)
+    if not data:
+        return array('d')
 
-    :param word: String
+    return data
 
-    :return: Stemmed word
+def parse_query(search_string, stop_word_list):
     """
-    return stem(word)
+        Clean and stem the query terms and the phrases of the query.
+
+        "a b c" is a phrase, "a b c"~k matches the terms within k words of
+        each other in any order. A phrase of a single term is just a term.
 
-def sanitize(text, stop_word_list):
+        :return (query terms, list of (phrase terms, window)), the window is
+            None for an exact phrase
     """
-        Reads a text, remove stop words, stem the words.
+    phrases = []
+    for match in PHRASE_RE.finditer(search_string):
+        terms = sanitize(match.group(1), stop_word_list)
+        if len(terms) < 2:
+            continue
 
-    :param text: String
+        window = match.group(2)
+        if window is not None:
+            window = max(int(window), len(set(terms)) - 1)
+        phrases.append((terms, window))
 
-    :return: List of words
-    """
+    query_terms = sanitize(PHRASE_RE.sub(r" \1 ", search_string), stop_word_list)
+    return query_terms, phrases
 
-    # convert the text into Unicode
-    text = unicode(text)
+def get_links(index_data, query_terms, conjunctive=True, phrases=None):
+    """
+        Get all the links which contains the terms in the query string.
 
-    #print(type(text))
+        :param index_data MappedIndex
+        :param query_terms as list of strings
+        :param conjunctive True for the links with all the terms (AND),
+            False for the links with any of the terms (OR)
+        :param phrases list of (terms, window) of parse_query the links
+            must match, ignored when the index has no positions
 
-    # replace dot with space
-    text = text.translate({ord("."): ord(" ")})
-    # replace dash with space
-    text = text.translate({ord("-"): ord(" ")})
+        :return sorted list of doc ids, empty if no link matches
+    """
+    if not conjunctive:
+        return disjunction(index_data, query_terms)
 
-    # split the text on white-space
-    words = text.split()
-    sanitized_words = []
-    for w in words:
+    links = conjunction(index_data, query_terms)
+    return filter_phrases(index_data, links, phrases)
 
-        # ignore numbers
-        if w.isnumeric():
-            continue
+def filter_phrases(index_data, links, phrases):
+    """
+        :return the links which match all the phrases
+    """
+    if not phrases or not index_data.has_positions:
+        return links
 
-        # print("Word (Before Punctuation): " + w)
+    for terms, window in phrases:
+        links = positionFilter(index_data, links, terms, window)
 
-        # remove punctuation
-        # Ref: https://stackoverflow.com/questions/265960/best-way-to-strip-punctuation-from-a-string-in-python
-        # w = w.translate(None, string.punctuation)
+    return links
 
-        # The above method does not work for Unicode strings
-        # Ref: https://stackoverflow.com/questions/23175809/typeerror-translate-takes-one-argument-2-given-python#23306505
-        # print(type(w))
+def field_boosts(boosts=None):
+    """
+        :param boosts dictionary of field and boost, a field not given gets
+            its FIELD_BOOSTS boost
 
-        # replace punctuations with None
-        w = w.translate({ord(c): None for c in string.punctuation})
-        w = w.lower()
-        # print("Word (After Punctuation): "+w)
+        :return tuple of the boosts of diskindex.FIELDS
+    """
+    boosts = boosts or {}
+    for field, boost in boosts.items():
+        if field not in FIELD_BOOSTS:
+            raise ValueError("Unknown field: %s" % field)
+        if boost < 0:
+            raise ValueError("Negative boost of field %s" % field)
 
-        # Note: Remove stop-words before Stemming, or else the stop-word
-        # matching will not work.
-        # If the word is in Stop Word List
-        try:
-            i = stop_word_list.index(w.lower())
-            # skip further processing of word loop
-            # print("Stop Word Removed: "+w)
-            continue
-        except ValueError:
-            pass
+    return tuple(float(boosts.get(field, FIELD_BOOSTS[field])) for field in FIELDS)
 
-        w = stemm_word(w)
+def parse_boosts(text):
+    """
+        Parse field boosts given as "title:3,anchor:2".
 
-        # hack, hack, hack
-        if w == '':
+        :return dictionary of field and boost
+    """
+    boosts = {}
+    for item in text.split(","):
+        if not item.strip():
             continue
+        field, sep, boost = item.partition(":")
+        if not sep:
+            raise ValueError("Expected field:boost, got %s" % item)
+        boosts[field.strip()] = float(boost)
 
-        # add the sanitized word into return list
-        sanitized_words.append(w)
-
-    return sanitized_words
+    field_boosts(boosts)
+    return boosts
 
-def get_links(query_terms):
+def term_weights(index_data, query_terms, model=DEFAULT_MODEL, k1=BM25_K1, b=BM25_B, boosts=None):
     """
-        Get all the links which contains the terms in the query string.
+        Weigh the query terms for scoring.
+
+        The score of a doc is the sum of the term contributions
+        weight * f(tf, doc) over the query terms, with
 
+        tfidf: f = tf / norm(doc) and weight = qtf * idf^2 / |q|, the sum is
+            the cosine similarity of the TF-IDF query and doc vectors
+        bm25: f = tf * (k1 + 1) / (tf + k1 * (1 - b + b * length(doc) / avg))
+            and weight = qtf * log(1 + (N - df + 0.5) / (df + 0.5))
+        bm25f: the same with tf * (k1 + 1) / (tf + k1), where tf is the
+            sum of the field tfs, each normalized by the field length as in
+            bm25 and multiplied by the boost of the field
+
+        :param index_data MappedIndex
         :param query_terms as list of strings
+        :param model "tfidf", "bm25" or "bm25f"
+        :param boosts dictionary of field and boost of the bm25f model
 
-        :return 
+        :return list of [term, weight, upper bound of the contribution] for
+            the query terms found in the index
     """
+    if model not in RANKING_MODELS:
+        raise ValueError("Unknown ranking model: %s" % model)
 
-    # the set of links all of which contains all the terms in the query string
-    final_links = None
-    for term in query_terms:
-        # get all links containing the term and put in a set
-        links = Set(index_data.get(term))
-        #print("\n\nQuery Term: %s" % term)
-        #print(links)
+    tf = {}
+    for w in query_terms:
+        tf[w] = tf.get(w, 0) + 1
+
+    docs = index_data.docs
+    N = index_data.num_docs
+    boosts = field_boosts(boosts)
+
+    terms = []
+    query_norm = 0.0
+    for term, qtf in sorted(tf.items()):
+        bounds = index_data.bounds(term)
+        # if the query term is NOT found in files, it adds nothing
+        if bounds is None:
+            continue
 
-        # special case for first iteration, because: empty & anything = empty
-        if final_links == None:
-            final_links = links
+        max_tf, min_length, max_weight = bounds
+        if model == "tfidf":
+            idf = index_data.idf(term)
+            query_norm += (qtf * idf) ** 2
+            weight = qtf * idf * idf
+            upper_bound = weight * max_weight / idf if idf > 0 else 0.0
+        else:
+            df = index_data.df(term)
+            weight = qtf * math.log(1 + (N - df + 0.5) / (df + 0.5))
+            if model == "bm25":
+                K = k1 * (1 - b + b * min_length / docs.avg_length)
+                upper_bound = weight * max_tf * (k1 + 1) / (max_tf + K)
+            else:
+                # the largest tf of every field in the shortest field
+                max_field_tf = 0.0
+                for (field_max_tf, field_min_length), avg, boost in zip(index_data.fieldBounds(term),
+                                                                       docs.avg_field_lengths, boosts):
+                    if field_max_tf:
+                        max_field_tf += boost * field_max_tf / (1 - b + b * field_min_length / avg)
+                upper_bound = weight * max_field_tf * (k1 + 1) / (max_field_tf + k1)
+
+        terms.append([term, weight, upper_bound])
+
+    if model == "tfidf" and query_norm > 0:
+        query_norm = math.sqrt(query_norm)
+        for t in terms:
+            t[1] /= query_norm
+            t[2] /= query_norm
+
+    # leave room for rounding in the upper bounds
+    for t in terms:
+        t[2] *= 1 + 1e-9
+
+    return terms
+
+def model_postings(index_data, term, model=DEFAULT_MODEL):
+    """
+        The postings of a term as the ranking model scores them.
 
-        # take intersection of links set
-        final_links = final_links & links
+        :return list of doc ids, list of tfs or for bm25f of the tuples of
+            the field tfs
+    """
+    if model == "bm25f":
+        return index_data.fieldPostings(term)
 
-        #print(final_links)
+    return index_data.postings(term)
 
-    # convert the Set to List and return
-    return list(final_links)
+def query_postings(index_data, query_terms, model=DEFAULT_MODEL, k1=BM25_K1, b=BM25_B, boosts=None):
+    """
+        Prepare the postings of the query terms for scoring, see term_weights.
 
-def rank_links(tf_idf_table, query_terms, links):
+        :return list of [doc ids, tfs, weight, upper bound of the contribution]
+            for the query terms found in the index
     """
-        Rank the list of given links in terms of relevance.
+    terms = []
+    for term, weight, upper_bound in term_weights(index_data, query_terms, model, k1, b, boosts):
+        doc_ids, tfs = model_postings(index_data, term, model)
+        terms.append([doc_ids, tfs, weight, upper_bound])
 
-        :param TF-IDF table
-        :param query_terms as list of strings
-        :param links List of URLs
+    return terms
 
-        :return List of URLs ranked
+def term_score(docs, model, doc, tf, k1=BM25_K1, b=BM25_B, boosts=None):
     """
-    
-    tf = {}
-    for w in query_terms:
-        f = query_terms.count(w)
-        tf[w] = f
-
-    q_tf_idf = {}
-    for term in tf:
-        # if the query term is found in files
-        if tf_idf_table.has_key(term):
-            q_tf_idf[term] = tf.get(term) # * log(N/1)
-        else:
-            # if the query term is NOT found in files, set IDF to 0
-            q_tf_idf[term] = 0
+        f(tf, doc) of term_weights, the contribution of a term without
+        the term weight.
 
-    # score of all docs for this query    
-    doc_vals = {}
+        :param tf the tf or for bm25f the tuple of the field tfs
+        :param boosts tuple of the field boosts of bm25f, see field_boosts
+    """
+    if model == "tfidf":
+        norm = docs.norm(doc)
+        return tf / norm if norm > 0 else 0.0
+
+    if model == "bm25f":
+        field_tfs = tf
+        tf = 0.0
+        for field_tf, length, avg, boost in zip(field_tfs, docs.fieldLengths(doc), docs.avg_field_lengths,
+                                                boosts or field_boosts()):
+            if field_tf:
+                tf += boost * field_tf / (1 - b + b * length / avg)
+        return tf * (k1 + 1) / (tf + k1)
+
+    K = k1 * (1 - b + b * docs.length(doc) / docs.avg_length)
+    return tf * (k1 + 1) / (tf + K)
+
+def rank_links(index_data, query_terms, links, model=DEFAULT_MODEL, k1=BM25_K1, b=BM25_B, topN=None, boosts=None):
+    """
+        Rank the list of given links in terms of relevance.
 
-    # Wiq denominator in CosSim
-    DWiq = 0
-    for t in tf_idf_table:       
+        Only the postings of the query terms are read and the scores are
+        accumulated per doc in a single pass. The IDFs, doc lengths and doc
+        vector lengths come precomputed from the index.
 
-        DWiq = q_tf_idf.get(t)
-        # if the term is not in query, ignore
-        if DWiq == None:
-            continue
+        tfidf: cosine similarity of the TF-IDF weighted query and doc vectors
+        bm25: Okapi BM25 with the parameters k1 and b
+        bm25f: BM25 over the title, heading, body and anchor text fields,
+            weighted by the boosts
 
+        With topN only the best topN docs are kept, see top_k.
 
-        #print("Term: %s \t\t Query TF-IDF: %d" % (t, q_tf_idf.get(t)))
+        :param index_data MappedIndex
+        :param query_terms as list of strings
+        :param links List of doc ids, None for every doc
+        :param model "tfidf", "bm25" or "bm25f"
+        :param boosts dictionary of field and boost, see FIELD_BOOSTS
 
-        idf_row = tf_idf_table.get(t)
-        # if the query term is in our corpus
-        if idf_row != None:
-            #print(idf_row)
+        :return OrderedDict of doc id and score sorted by score
+    """
+    if topN is not None:
+        sorted_by_score = top_k(index_data, query_terms, topN, links, model, k1, b, boosts)
+    else:
+        # the docs allowed in the result
+        candidates = set(links) if links is not None else None
 
-            # get the document frequency
-            df = float(len(idf_row))
-            #print("DF: %d" % (df))
+        docs = index_data.docs
+        field_boost = field_boosts(boosts)
 
-            # Wij denominator in CosSim
-            DWij = 0
+        # score accumulators of the docs for this query
+        doc_score = {}
+        for doc_ids, tfs, weight, _ in query_postings(index_data, query_terms, model, k1, b, boosts):
+            for doc, tf in zip(doc_ids, tfs):
+                if candidates is not None and doc not in candidates:
+                    continue
 
-            # Numerator in CosSim
-            Njq = 0
+                score = weight * term_score(docs, model, doc, tf, k1, b, field_boost)
+                doc_score[doc] = doc_score.get(doc, 0.0) + score
 
-            # calculate values of each document specific
+        sorted_by_score = sorted(doc_score.items(), key=lambda e: (-e[1], e[0]))
 
-            for doc in idf_row:
-                #print(doc)
+    sorted_score = collections.OrderedDict()
+    for doc, score in sorted_by_score:
+        sorted_score[doc] = score
 
-                # The "df" should not be processed
-                if doc == "df":
-                    continue
+    return sorted_score
 
-                # skip any link that are not relevant
-                try:
-                    _ = links.index(doc)
-                except:
-                    continue
+def top_k(index_data, query_terms, k, links=None, model=DEFAULT_MODEL, k1=BM25_K1, b=BM25_B, boosts=None):
+    """
+        The k best docs for the query with MaxScore early termination.
+
+        The docs are visited in doc id order and the best k are kept in a
+        heap. The query terms are sorted by the upper bound of their
+        contribution; once the heap is full the terms whose bounds together
+        cannot beat the k-th score are non-essential: a doc found only in
+        their postings can not enter the top k and is never visited, their
+        postings are only galloped to the docs of the essential terms, and
+        the scoring of a doc stops as soon as its remaining bounds can not
+        lift it above the k-th score.
+
+        :param index_data MappedIndex
+        :param query_terms as list of strings
+        :param k number of docs to return
+        :param links List of doc ids allowed in the result, None for every doc
+        :param boosts dictionary of field and boost, see FIELD_BOOSTS
 
-                #print("Doc ID: %s \tTF: %d" % (doc, idf_row.get(doc)))
+        :return list of (doc id, score) sorted by score, ties by doc id
+    """
+    if k <= 0:
+        return []
 
-                DWij = idf_row.get(doc)
+    candidates = set(links) if links is not None else None
+    docs = index_data.docs
+    field_boost = field_boosts(boosts)
 
-                #Njq =  q_tf_idf.get(t) * idf_row.get(doc)
+    # terms in increasing order of their upper bound
+    terms = sorted(query_postings(index_data, query_terms, model, k1, b, boosts), key=operator.itemgetter(3))
+    if not terms:
+        return []
 
-                if doc_vals.has_key(doc):
-                    vals = doc_vals.get(doc)
-                    vals["DWiq"] += pow(DWiq, 2)
-                    vals["DWij"] += pow(DWij, 2)
-                    vals["NWjq"] += DWij * DWiq
+    # cumulative[i] is the sum of the upper bounds of the terms 0..i
+    cumulative = []
+    total = 0.0
+    for t in terms:
+        total += t[3]
+        cumulative.append(total)
 
-                    doc_vals[doc]  = vals
-                else:
-                    vals = {}
-                    vals["DWiq"] = pow(DWiq, 2)
-                    vals["DWij"] = pow(DWij, 2)
-                    vals["NWjq"] = DWij * DWiq
+    # the next posting of every term
+    positions = [0] * len(terms)
 
-                    doc_vals[doc]  = vals
+    # min-heap of (score, -doc id), the worst result on top
+    heap = []
+    threshold = -1.0
 
-    #print(doc_vals)
+    # terms[first_essential:] are essential
+    first_essential = 0
 
-    # Calculate the CosSim value
-    doc_score = {}
-    for doc in doc_vals:
-        #print(doc)
-        vals = doc_vals.get(doc)
-        #print(vals)
-        #n = vals.get("NWjq")
-        #d = float(pow(vals.get("DWij") * vals.get("DWiq"),0.5))
-        #print(n)
-        #print(d)            
-        #print(float(n/float(d)))
-        doc_score[doc] = float(vals.get("NWjq"))/float(pow(vals.get("DWij") * vals.get("DWiq"),0.5))
-        #print(doc_score[doc])
+    while True:
+        # the next doc is the smallest doc id in the essential postings
+        doc = None
+        for i in range(first_essential, len(terms)):
+            doc_ids = terms[i][0]
+            if positions[i] < len(doc_ids) and (doc is None or doc_ids[positions[i]] < doc):
+                doc = doc_ids[positions[i]]
+        if doc is None:
+            break
 
+        # score the essential terms, moving their cursors past doc
+        score = 0.0
+        for i in range(first_essential, len(terms)):
+            doc_ids, tfs, weight, _ = terms[i]
+            p = positions[i]
+            if p < len(doc_ids) and doc_ids[p] == doc:
+                score += weight * term_score(docs, model, doc, tfs[p], k1, b, field_boost)
+                positions[i] = p + 1
 
-    #print(doc_score)
+        if candidates is not None and doc not in candidates:
+            continue
 
-    sorted_by_score = sorted(doc_score.items(), key=operator.itemgetter(1), reverse=True)
-    #print(sorted_by_score)
+        # add the non-essential terms, the largest bounds first
+        for i in range(first_essential - 1, -1, -1):
+            if score + cumulative[i] <= threshold:
+                break
 
-    sorted_score = collections.OrderedDict()
-    for url, score in sorted_by_score:
-        sorted_score[url] = score
+            doc_ids, tfs, weight, _ = terms[i]
+            p = gallop(doc_ids, doc, positions[i])
+            positions[i] = p
+            if p < len(doc_ids) and doc_ids[p] == doc:
+                score += weight * term_score(docs, model, doc, tfs[p], k1, b, field_boost)
+        else:
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -doc))
+            elif score > threshold:
+                heapq.heapreplace(heap, (score, -doc))
+            else:
+                continue
 
-    #print(sorted_score)
-    return sorted_score
-    
+            if len(heap) == k:
+                threshold = heap[0][0]
+                while first_essential < len(terms) and cumulative[first_essential] <= threshold:
+                    first_essential += 1
 
-def print_scores(ranked_list, links, topN=10):
+    return [(-neg_doc, score) for score, neg_doc in sorted(heap, key=lambda e: (-e[0], -e[1]))]
+
+
+def print_scores(ranked_list, links, docs, topN=10):
     """
         Takes an OrderdDict and print topN entries which are also in links
+
+        :param docs DocTable giving the URL of a doc id
     """
-    n = topN
-    for url, score in ranked_list.items():
-        try:
-            _  = links.index(url)
-            print("Score: %f \t URL: %s" %(score, url))
+    links = set(links)
 
-            n -= 1
+    n = topN
+    for doc, score in ranked_list.items():
+        if doc not in links:
+            continue
 
-            if n <= 0:
-                break
-        except:
-            pass
+        print("Score: %f \t URL: %s" %(score, docs[doc]))
 
-        
+        n -= 1
+        if n <= 0:
+            break
 
 def normalize_scores(scores):
     """
@@ -330,153 +507,152 @@ def normalize_scores(scores):
     return new_scores
 
 def calculate_pagerank_with_teleport(Graph, epsilon, iterations=50):
-    prev_score = None
-    score = None
-    iteration = 1
+    """
+        PageRank with teleport for the nodes of Graph.
 
-    #print("No. of Nodes: %d" % len(Graph))
+        :param Graph as dictionary of link with destination links, links
+            which are not keys of Graph are ignored
+        :param epsilon the teleport probability
+        :param iterations upper bound on the number of iterations
 
-    # Loop 
-    while True:
-        #print("\nIteration: "+str(iteration))
-        iteration += 1
-
-        # first iteration
-        if score is None:
-            score = {}
-            no_of_nodes = len(Graph.keys())
-            for node in Graph:
-                score[node] = 1/float(no_of_nodes)
-        else:
-            # normal iterations
-            score = {}
-            for A in Graph:
-                #print("-"*10)
-                #print("Node: "+A)
-
-                # Reinitialize the score
-                score[A] = epsilon/float(no_of_nodes)
-
-                for B in Graph:    
-                    #print("Link from: "+B)
-                    #print(Graph.get(B))
-                    #print(Graph.get(B).index(A))
-                    try:
-                        _ = Graph.get(B).index(A)                    
-                        #print(B+" points to "+A)
-                        degree_B = len(Graph.get(B))   
-                        #print("Score: "+str(prev_score[B]))
-                        #print("Degree: "+str(degree_B))
-                        #print("Adding "+str(prev_score[B]/float(degree_B))+ " to "+str(score[A]))
-                        score[A] += (1-epsilon) * prev_score[B]/float(degree_B)
-                        #print("New score:"+str(score[A]))
-                        
-                        
-                    except ValueError:
-                        #print(A +" not in "+B)
-                        pass
-                score[A] = round(score[A], ROUND_DIGITS)
-
-        #print("Before Normalization")
-        #print_scores(score)
-        #normalize the scores
-        #print("After Normalization")
-        score = normalize_scores(score)
-        #print_scores(score)
-
-        # check for convergence
-        if score == prev_score:
-            break
-        
-        prev_score = score
-
-        if iteration > iterations:
-            break
+        :return OrderedDict of link and score sorted by score
+    """
+    link_graph = build_link_graph(Graph, Graph.keys())
+    score = pagerank(link_graph, epsilon, max_iterations=iterations)
 
     # sort by score
-    sorted_by_score = sorted(score.items(), key=operator.itemgetter(1), reverse=True)
-
-    #print(sorted_by_score)
+    sorted_by_score = sorted(zip(link_graph.nodes, score), key=operator.itemgetter(1), reverse=True)
 
     sorted_score = collections.OrderedDict()
     for url, score in sorted_by_score:
         sorted_score[url] = score
 
-    #print(sorted_score)
+    return sorted_score
 
+def rank_by_pagerank(pagerank_data, links, topN=None):
+    """
+        Rank the links with their static PageRank score.
 
-    return sorted_score
+        :param pagerank_data as array of PageRank scores indexed by doc id
+        :param links List of doc ids
+        :param topN keep only the best topN links, None for all
 
-def build_graph(link_data, links):
+        :return OrderedDict of doc id and score sorted by score
     """
-        Use the link_data to build a graph of the links.
+    n = len(pagerank_data)
+    scores = [(doc, pagerank_data[doc] if doc < n else 0.0) for doc in links]
+    if topN is not None:
+        sorted_by_score = heapq.nlargest(topN, scores, key=operator.itemgetter(1))
+    else:
+        sorted_by_score = sorted(scores, key=operator.itemgetter(1), reverse=True)
 
-        :param link_data as dictionary of source link with destination links
-        :param links the links as list for which the graph need to be created
+    sorted_score = collections.OrderedDict()
+    for doc, score in sorted_by_score:
+        sorted_score[doc] = score
+
+    return sorted_score
 
-        :return graph as dictionary
+def search(index_data, pagerank_data, stop_word_list, search_string, model=DEFAULT_MODEL, topN=10,
+           verbose=True, cache=None, boosts=None):
     """
-    graph = {}
+        1. Clean and Stem the query terms
+        2. Get all the links which contain the query terms
+        3. Rank the links with the ranking model and the static PageRank
 
-    # add all data for links
-    for l in links:
-        #print("Adding "+l)
-        #print(link_data.get(l))
-        graph[l] = list(link_data.get(l))
+        :param verbose print the query terms and the matching links
+        :param cache QueryCache of the results, None to always search
+        :param boosts dictionary of field and boost of the bm25f model
+    """
 
-    # add all links that point to links
-    for slink in link_data:
-        for l in links:
-            # the links is already in graph, skip
-            if graph.has_key(slink):
-                continue
+    query_terms, phrases = parse_query(search_string, stop_word_list)
+
+    # the result does not depend on the order of the query terms
+    key = (tuple(sorted(query_terms)), tuple((tuple(terms), window) for terms, window in sorted(phrases)),
+           model, topN, EPSILON, field_boosts(boosts))
+    cached = None
+    if cache is not None:
+        cached = cache.get(key, index_data.generation)
+
+    if cached is not None:
+        links, vector_ranked, page_ranked = cached
+    else:
+        # get all links which contain all the query terms and the phrases
+        links = get_links(index_data, query_terms, phrases=phrases)
 
-            try:
-                dest_links = list(link_data.get(slink))
-                # if slink points to l
-                _ = dest_links.index(l)
-                # add the slink to graph
-                graph[slink] = dest_links
-                #print("Adding "+slink)
-            except Exception as e:
-                pass
+        # rank the links using the TF-IDF or BM25 model
+        vector_ranked = rank_links(index_data, query_terms, links, model, topN=topN, boosts=boosts)
 
-    #print(len(graph))
-    #print(graph)
+        # rank the links using the PageRank computed at index time
+        page_ranked = rank_by_pagerank(pagerank_data, links, topN)
 
-    return graph
+        if cache is not None:
+            cache.put(key, index_data.generation, (links, vector_ranked, page_ranked))
 
+    if verbose:
+        print(query_terms)
+        print("\nURLs containing all of the query terms (%d):" % len(links))
+        for l in links:
+            print(index_data.docs[l])
+
+    # return the data
+    return links, vector_ranked, page_ranked
 
-def search(index_data, link_data, stop_word_list, search_string):
+def search_batch(index_data, pagerank_data, stop_word_list, search_strings, model=DEFAULT_MODEL, topN=10,
+                 boosts=None):
     """
-        1. Clean and Stem the query terms
-        2. Get all the links which contain the query terms
-        3. Rank the links
+        Search many queries at once, the same results as search() for each.
+
+        The postings of every distinct query term are decoded once and
+        f(tf, doc) of term_weights is calculated once per posting, in a
+        single pass over the postings. A query then only adds up the
+        precalculated values of its terms for its matching links.
+
+        :param search_strings list of query strings
+        :param boosts dictionary of field and boost of the bm25f model
+
+        :return list of (links, vector_ranked, page_ranked) in query order
     """
+    parsed = [parse_query(s, stop_word_list) for s in search_strings]
+    queries = [query_terms for query_terms, _ in parsed]
+    docs = index_data.docs
+    field_boost = field_boosts(boosts)
+
+    # decode the postings of every distinct term once, with f(tf, doc) of
+    # every doc of the postings
+    postings = {}
+    term_scores = {}
+    for query_terms in queries:
+        for term in query_terms:
+            if term in postings:
+                continue
 
-    topN = 5
+            doc_ids, tfs = model_postings(index_data, term, model)
+            postings[term] = doc_ids
+            term_scores[term] = dict((doc, term_score(docs, model, doc, tf, boosts=field_boost))
+                                     for doc, tf in zip(doc_ids, tfs))
+
+    results = []
+    for query_terms, phrases in parsed:
+        # the links with all the terms of the query, rarest term first
+        lists = sorted((postings[term] for term in set(query_terms)), key=len)
+        links = lists[0] if lists else []
+        for doc_ids in lists[1:]:
+            if not links:
+                break
+            links = intersect(links, doc_ids)
+        links = filter_phrases(index_data, links, phrases)
 
-    query_terms = sanitize(search_strings, stop_word_list)
-    print(query_terms)
+        weights = [(term_scores[term], weight) for term, weight, _ in term_weights(index_data, query_terms, model,
+                                                                                   boosts=boosts)]
+        doc_score = [(doc, sum(weight * scores[doc] for scores, weight in weights)) for doc in links]
 
-    # get all links which contain all the query terms
-    links = get_links(query_terms)
-    print("\nURLs containing all of the query terms (%d):" % len(links))
-    for l in links:
-        print(l)
+        vector_ranked = collections.OrderedDict()
+        for doc, score in heapq.nsmallest(topN, doc_score, key=lambda e: (-e[1], e[0])):
+            vector_ranked[doc] = score
 
-    # rank the links using Vector model
-    vector_ranked = rank_links(index_data, query_terms, links)
-    #print(ranked_list)
-    
-    # build a graph of the links
-    graph = build_graph(link_data, links)
+        results.append((links, vector_ranked, rank_by_pagerank(pagerank_data, links, topN)))
 
-    # rank the links using Vector model
-    page_ranked = calculate_pagerank_with_teleport(graph, EPSILON, 10)        
-    
-    # return the data
-    return links, vector_ranked, page_ranked
+    return results
 
 
 if __name__ == "__main__":
@@ -484,8 +660,7 @@ if __name__ == "__main__":
     # get stop-words
     stop_word_list = getStopWordList("stopwords.txt")
 
-    index_data, link_data = loadData()
-    #print(link_data)
+    index_data, pagerank_data = loadData()
     
     search_strings = [
         #"computer science"
@@ -506,12 +681,12 @@ if __name__ == "__main__":
     ]
     for s in search_strings:
         print("\n\nQuery: %s" % s)
-        links, vector_ranked, page_ranked = search(index_data, link_data, stop_word_list, s)
-        print("\n\nVector model result:")
-        print_scores(vector_ranked, links)
+        links, vector_ranked, page_ranked = search(index_data, pagerank_data, stop_word_list, s)
+        print("\n\n%s model result:" % DEFAULT_MODEL)
+        print_scores(vector_ranked, links, index_data.docs)
 
         print("\n\nPageRank with teleport(e=%f) result:" % EPSILON)
-        print_scores(page_ranked, links)
+        print_scores(page_ranked, links, index_data.docs)
         
 
         
@@ -0,0 +1,141 @@
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
+import logging
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# number of segment files a dictionary is split into
+NUM_SEGMENTS = 64
+
+
+def segmentOf(key, num_segments):
+    """
+        Stable segment number of a key, the same on every run and machine.
+    """
+    if isinstance(key, int):
+        return key % num_segments
+
+    if isinstance(key, unicode):
+        key = key.encode("utf-8")
+    return (zlib.crc32(key) & 0xffffffff) % num_segments
+
+
+def canonical(value, objects):
+    """
+        Copy nested dictionaries with their keys inserted in sorted order and
+        equal keys shared, so equal data always pickles to the same bytes no
+        matter in which order it was built.
+    """
+    if isinstance(value, dict):
+        new_value = {}
+        for k in sorted(value):
+            new_value[objects.setdefault(k, k)] = canonical(value[k], objects)
+        return new_value
+
+    return value
+
+
+class SegmentedDict(object):
+    """
+        A dictionary stored as NUM_SEGMENTS pickle files in a directory.
+
+        A segment is loaded the first time one of its keys is used and only
+        the segments changed since then are written by save(). Values are
+        usually dictionaries themselves, a value changed in place must be
+        assigned back (d[key] = value) to mark its segment changed.
+    """
+
+    def __init__(self, directory, num_segments=NUM_SEGMENTS):
+        self.directory = directory
+        self.num_segments = num_segments
+        self.segments = [None] * num_segments
+        self.dirty = set()
+
+    def _segmentFile(self, n):
+        return os.path.join(self.directory, "%03d.pkl" % n)
+
+    def _segment(self, key):
+        n = segmentOf(key, self.num_segments)
+        segment = self.segments[n]
+        if segment is None:
+            segment = self._load(n)
+        return n, segment
+
+    def _load(self, n):
+        segment = {}
+        try:
+            with open(self._segmentFile(n), "rb") as fd:
+                segment = pickle.load(fd)
+        except (IOError, EOFError):
+            pass
+
+        self.segments[n] = segment
+        return segment
+
+    def _loadAll(self):
+        for n in range(self.num_segments):
+            if self.segments[n] is None:
+                self._load(n)
+
+    def get(self, key, default=None):
+        return self._segment(key)[1].get(key, default)
+
+    def __getitem__(self, key):
+        return self._segment(key)[1][key]
+
+    def __setitem__(self, key, value):
+        n, segment = self._segment(key)
+        segment[key] = value
+        self.dirty.add(n)
+
+    def __delitem__(self, key):
+        n, segment = self._segment(key)
+        del segment[key]
+        self.dirty.add(n)
+
+    def __contains__(self, key):
+        return key in self._segment(key)[1]
+
+    def has_key(self, key):
+        return key in self
+
+    def __iter__(self):
+        self._loadAll()
+        for segment in self.segments:
+            for key in segment:
+                yield key
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        self._loadAll()
+        return [item for segment in self.segments for item in segment.items()]
+
+    def __len__(self):
+        self._loadAll()
+        return sum(len(segment) for segment in self.segments)
+
+    def save(self):
+        """
+            Write the changed segments. Each segment is written to a
+            temporary file first and renamed, so a failed run never leaves a
+            half written segment behind.
+        """
+        logger.info("Saving %d of %d segments to: %s", len(self.dirty), self.num_segments, self.directory)
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        for n in sorted(self.dirty):
+            segment_file = self._segmentFile(n)
+            with open(segment_file + ".tmp", "wb") as fd:
+                pickle.dump(canonical(self.segments[n], {}), fd, pickle.HIGHEST_PROTOCOL)
+            os.rename(segment_file + ".tmp", segment_file)
+
+        self.dirty = set()
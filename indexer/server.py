@@ -0,0 +1,285 @@
+"""
+    Search server: the index is loaded once and the queries are answered
+    over HTTP with JSON, one thread per request.
+
+        GET  /search?q=<query>[&n=10][&model=tfidf|bm25|bm25f][&boosts=title:3,anchor:2]
+        GET  /stats         latency and query cache metrics
+        POST /reload
+
+    A new index built by the indexer is swapped in without a restart: the
+    index directory is polled for a new generation (see
+    indexer.saveGeneration), or POST /reload swaps at once. The requests
+    running at the time finish on the index they started with.
+
+    Usage:
+        python server.py --index-dir . --port 8080
+"""
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+
+import argparse
+import json
+import threading
+import time
+import traceback
+
+from analyzer import getStopWordList
+from metrics import LatencyRecorder
+from querycache import CACHE_SIZE, CACHE_TTL, QueryCache
+from search import DEFAULT_MODEL, loadData, loadGeneration, parse_boosts, search
+
+# seconds between two checks for a new index generation
+WATCH_INTERVAL = 2.0
+
+# largest number of results a request may ask for
+MAX_RESULTS = 100
+
+
+class IndexSnapshot(object):
+    """
+        Everything a query needs from one generation of the index.
+
+        The requests using the snapshot are counted by the server, a
+        snapshot replaced by a new one is closed when the count drops to 0.
+    """
+
+    def __init__(self, index_dir):
+        self.index_data, self.pagerank_data = loadData(index_dir)
+        self.generation = self.index_data.generation
+        self.loaded = time.time()
+
+        # number of requests using the snapshot, and replaced by a newer one
+        self.users = 0
+        self.retired = False
+
+    def close(self):
+        """
+            Unmap the index files.
+        """
+        self.index_data.close()
+
+
+class SearchServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, index_dir, stop_word_list, quiet=False, cache=None):
+        HTTPServer.__init__(self, address, SearchHandler)
+
+        self.index_dir = index_dir
+        self.stop_word_list = stop_word_list
+        self.quiet = quiet
+        self.cache = cache
+
+        self.snapshot = IndexSnapshot(index_dir)
+        self.reload_lock = threading.Lock()
+        # guards self.snapshot and the user counts of the snapshots
+        self.snapshot_lock = threading.Lock()
+        self.latency = LatencyRecorder()
+        self.started = time.time()
+
+    def reload(self, force=False):
+        """
+            Load the index again if its generation changed. The new snapshot
+            replaces the old one at once, the old one is closed by the last
+            request using it, see release.
+
+            :return True if a new index was loaded
+        """
+        with self.reload_lock:
+            if not force and loadGeneration(self.index_dir) == self.snapshot.generation:
+                return False
+
+            snapshot = IndexSnapshot(self.index_dir)
+            with self.snapshot_lock:
+                old, self.snapshot = self.snapshot, snapshot
+                old.retired = True
+                close = old.users == 0
+
+            if close:
+                old.close()
+
+        print("Loaded index generation %d from: %s" % (snapshot.generation, self.index_dir))
+        return True
+
+    def acquire(self):
+        """
+            :return the current snapshot, kept open until it is released
+        """
+        with self.snapshot_lock:
+            snapshot = self.snapshot
+            snapshot.users += 1
+        return snapshot
+
+    def release(self, snapshot):
+        """
+            Done with a snapshot of acquire, the last request using a
+            replaced snapshot closes it.
+        """
+        with self.snapshot_lock:
+            snapshot.users -= 1
+            close = snapshot.retired and snapshot.users == 0
+
+        if close:
+            snapshot.close()
+
+    def watch(self, interval=WATCH_INTERVAL):
+        """
+            Check for a new index generation every interval seconds, in a
+            background thread.
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload()
+                except Exception as e:
+                    print("Cannot load the new index: %s" % e)
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def query(self, search_string, topN=10, model=DEFAULT_MODEL, boosts=None):
+        """
+            Run a search on the current snapshot.
+
+            :param boosts dictionary of field and boost of the bm25f model
+
+            :return dictionary of the query result
+        """
+        snapshot = self.acquire()
+        try:
+            docs = snapshot.index_data.docs
+
+            links, vector_ranked, page_ranked = search(snapshot.index_data, snapshot.pagerank_data,
+                                                       self.stop_word_list, search_string, model, topN,
+                                                       verbose=False, cache=self.cache, boosts=boosts)
+
+            def result(doc, score):
+                return {"doc": doc, "url": docs.url(doc), "title": docs.title(doc), "score": score}
+
+            return {
+                "query": search_string,
+                "generation": snapshot.generation,
+                "model": model,
+                "matches": len(links),
+                "results": [result(doc, score) for doc, score in vector_ranked.items()],
+                "pagerank": [result(doc, score) for doc, score in list(page_ranked.items())[:topN]],
+            }
+        finally:
+            self.release(snapshot)
+
+    def stats(self):
+        snapshot = self.acquire()
+        try:
+            return {
+                "generation": snapshot.generation,
+                "index_loaded": snapshot.loaded,
+                "docs": len(snapshot.index_data.docs),
+                "terms": len(snapshot.index_data),
+                "uptime": time.time() - self.started,
+                "latency": self.latency.summary(),
+                "cache": self.cache.stats() if self.cache is not None else None,
+            }
+        finally:
+            self.release(snapshot)
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        start = time.time()
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if url.path == "/search":
+            search_string = params.get("q", [""])[0]
+            if isinstance(search_string, bytes):
+                search_string = search_string.decode("utf-8")
+
+            try:
+                topN = min(int(params.get("n", [10])[0]), MAX_RESULTS)
+                model = params.get("model", [DEFAULT_MODEL])[0]
+                boosts = parse_boosts(params.get("boosts", [""])[0])
+                data = self.server.query(search_string, topN, model, boosts)
+            except ValueError as e:
+                self.sendJSON(400, {"error": str(e)}, start)
+                return
+            except Exception as e:
+                # a failed query must not drop the connection without a reply
+                traceback.print_exc()
+                self.sendJSON(500, {"error": "Search failed: %s" % e}, start)
+                return
+
+            data["took_ms"] = 1000 * (time.time() - start)
+            self.sendJSON(200, data, start)
+        elif url.path == "/stats":
+            self.sendJSON(200, self.server.stats(), start)
+        else:
+            self.sendJSON(404, {"error": "Not found: " + url.path}, start)
+
+    def do_POST(self):
+        start = time.time()
+        url = urlparse(self.path)
+
+        if url.path == "/reload":
+            try:
+                self.server.reload(force=True)
+            except Exception as e:
+                self.sendJSON(500, {"error": "Cannot load the index: %s" % e}, start)
+                return
+            self.sendJSON(200, {"generation": self.server.snapshot.generation}, start)
+        else:
+            self.sendJSON(404, {"error": "Not found: " + url.path}, start)
+
+    def sendJSON(self, code, data, start):
+        body = json.dumps(data).encode("utf-8")
+
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        elapsed = time.time() - start
+        self.server.latency.add(elapsed)
+        if not self.server.quiet:
+            print("%s %s %d %.2fms" % (self.command, self.path, code, 1000 * elapsed))
+
+    def log_message(self, format, *args):
+        # the requests are logged with their latency by sendJSON
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CSSearch search server")
+    parser.add_argument("--index-dir", default=".", help="directory the indexer wrote the index to")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--stop-words", default="stopwords.txt")
+    parser.add_argument("--watch", type=float, default=WATCH_INTERVAL,
+                        help="seconds between checks for a new index, 0 to disable")
+    parser.add_argument("--quiet", action="store_true", help="do not log every request")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="number of cached results, 0 to disable")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL, help="seconds a result stays cached")
+    args = parser.parse_args()
+
+    cache = QueryCache(args.cache_size, args.cache_ttl) if args.cache_size > 0 else None
+    server = SearchServer((args.host, args.port), args.index_dir, getStopWordList(args.stop_words), args.quiet, cache)
+    if args.watch > 0:
+        server.watch(args.watch)
+
+    print("Serving index generation %d on http://%s:%d/" % (server.snapshot.generation, args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()